@@ -1,19 +1,74 @@
 import sys
 import os
-import subprocess
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QPushButton, QFileDialog, 
-    QLabel, QTableWidget, QTableWidgetItem, QComboBox, QHBoxLayout
+    QLabel, QTableView, QHeaderView, QHBoxLayout, QAbstractItemView,
+    QProgressBar, QSpinBox, QLineEdit, QCheckBox
 )
-from PySide6.QtGui import QPixmap
-from PySide6.QtCore import Qt
-import json
+from PySide6.QtCore import QThread, Signal, QObject, QFileSystemWatcher, QTimer
+import threading
+from worker_pool import LoaderPool, LoaderTimeout, load_render_settings
+from metadata_cache import MetadataCache
+from thumbnails import thumbnail_path_for, ensure_thumbnail, prune_thumbnails, RENDER_BUDGET, STARTUP_GRACE
+from job_scheduler import JobScheduler, JobCancelled, JobTimeout, PRIORITY_VISIBLE, PRIORITY_NORMAL
+from batch_save import save_entry, run_save_batch
+from ipc import ProtocolError
+from tracing import span
+from service_client import ServiceClient
+from settings_model import SettingsTableModel, SettingsFilterProxyModel, SettingsDelegate, PREVIEW_SIZE
+from directory_scan import (
+    default_concurrency, iter_blend_files, split_patterns,
+    file_signature, take_snapshot, diff_snapshots, DEFAULT_INCLUDE
+)
+
+# Seconds Blender may spend on the settings of one file, and how often a
+# file whose loader crashed is tried again
+LOAD_TIMEOUT = 120
+LOAD_RETRIES = 1
+# Seconds a save session may spend on one file
+SAVE_TIMEOUT = 300
+# Milliseconds between rescans of directories the system refused to watch
+POLL_INTERVAL = 5000
 
 class BlenderDirectoryExplorer(QWidget):
     def __init__(self):
         super().__init__()
+        # Resident bpy loaders, shared by every directory scan
+        self.loader_pool = LoaderPool()
+        # Settings of files that did not change since the last scan
+        self.metadata_cache = MetadataCache()
+        # Every Blender job: metadata first, thumbnails when no metadata is
+        # waiting, saves on their own
+        self.scheduler = JobScheduler({
+            "metadata": (default_concurrency(), []),
+            "thumbnail": (max(1, default_concurrency() // 2), ["metadata"]),
+            "save": (1, []),
+        })
+        self.scan_thread = None
+        self.save_job = None
+        self.save_signals = SaveSignals(self)
+        self.save_signals.file_saved.connect(self.on_file_saved)
+        self.save_signals.finished.connect(self.on_saves_finished)
+        # Watch mode: the opened tree, what was in it and changes still to load
+        self.dir_path = None
+        self.snapshot = {}
+        # Directories of the tree as of the last full scan, watched in watch mode
+        self.directories = set()
+        self.watcher = None
+        self.pending_changes = set()
         self.init_ui()
 
+    def closeEvent(self, event):
+        self.stop_watching()
+        self.cancel_scan(remove_pending=False)
+        # Kills renders and saves that are still running
+        self.scheduler.close()
+        for thread in self.findChildren(ScanThread):
+            thread.wait()
+        self.loader_pool.close()
+        self.metadata_cache.close()
+        super().closeEvent(event)
+
     def init_ui(self):
         self.setWindowTitle("Blender Directory Explorer")
         self.setGeometry(300, 300, 800, 600)
@@ -27,11 +82,85 @@ class BlenderDirectoryExplorer(QWidget):
         self.dir_label = QLabel("No directory selected", self)
         layout.addWidget(self.dir_label)
 
-        self.table = QTableWidget(self)
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["Select", "File Name", "Scenes", "Objects", "Render Samples"])
+        # Scan progress, cancel button and how many files are loaded at once
+        scan_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.hide()
+        scan_layout.addWidget(self.progress_bar)
+
+        self.cancel_button = QPushButton("Cancel", self)
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_scan)
+        scan_layout.addWidget(self.cancel_button)
+
+        scan_layout.addWidget(QLabel("Workers", self))
+        self.workers_spin = QSpinBox(self)
+        self.workers_spin.setRange(1, max(64, default_concurrency()))
+        self.workers_spin.setValue(default_concurrency())
+        scan_layout.addWidget(self.workers_spin)
+        layout.addLayout(scan_layout)
+
+        # Which files of the tree are loaded, and whether to follow changes
+        options_layout = QHBoxLayout()
+        options_layout.addWidget(QLabel("Include", self))
+        self.include_edit = QLineEdit(", ".join(DEFAULT_INCLUDE), self)
+        options_layout.addWidget(self.include_edit)
+        options_layout.addWidget(QLabel("Exclude", self))
+        self.exclude_edit = QLineEdit(self)
+        self.exclude_edit.setPlaceholderText("e.g. cache, */old/*")
+        options_layout.addWidget(self.exclude_edit)
+        options_layout.addWidget(QLabel("Depth", self))
+        self.depth_spin = QSpinBox(self)
+        self.depth_spin.setRange(-1, 100)
+        self.depth_spin.setSpecialValueText("Unlimited")
+        self.depth_spin.setValue(-1)
+        options_layout.addWidget(self.depth_spin)
+        # Optional scan_service.py that does the Blender work for everyone
+        options_layout.addWidget(QLabel("Service", self))
+        self.service_edit = QLineEdit(self)
+        self.service_edit.setPlaceholderText("none, e.g. 127.0.0.1:8765")
+        options_layout.addWidget(self.service_edit)
+        self.watch_check = QCheckBox("Watch", self)
+        self.watch_check.toggled.connect(self.on_watch_toggled)
+        options_layout.addWidget(self.watch_check)
+        layout.addLayout(options_layout)
+
+        # Rows narrowed down to the ones containing this text, in any column
+        self.filter_edit = QLineEdit(self)
+        self.filter_edit.setPlaceholderText("Filter files")
+        layout.addWidget(self.filter_edit)
+
+        # Settings of every loaded file. The model holds the values (and the
+        # edits made to them), the view only draws the rows on screen.
+        self.model = SettingsTableModel(self)
+        self.model.save_requested.connect(self.save_blend_file)
+        self.model.value_edited.connect(self.on_value_edited)
+        self.proxy = SettingsFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.filter_edit.textChanged.connect(self.proxy.setFilterFixedString)
+
+        self.table = QTableView(self)
+        self.table.setModel(self.proxy)
+        self.table.setItemDelegate(SettingsDelegate(self.model, self.table))
+        self.table.setSortingEnabled(True)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(
+            QAbstractItemView.DoubleClicked | QAbstractItemView.SelectedClicked | QAbstractItemView.EditKeyPressed
+        )
+        # Fixed row heights, so the view never measures rows it does not show
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(PREVIEW_SIZE + 4)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
         layout.addWidget(self.table)
-        self.save_settings = {}
+
+        # Files in view get their settings and thumbnails first
+        self.visible_timer = QTimer(self)
+        self.visible_timer.setSingleShot(True)
+        self.visible_timer.setInterval(100)
+        self.visible_timer.timeout.connect(self.prioritize_visible_rows)
+        self.table.verticalScrollBar().valueChanged.connect(self.schedule_visible_update)
+        self.proxy.rowsInserted.connect(self.schedule_visible_update)
+        self.proxy.layoutChanged.connect(self.schedule_visible_update)
         
         # Create an HBoxLayout for the custom directory selection
         custom_dir_layout = QHBoxLayout()
@@ -52,9 +181,7 @@ class BlenderDirectoryExplorer(QWidget):
         self.batch_save_button = QPushButton("Batch Save Selected Files", self)
         self.batch_save_button.clicked.connect(self.batch_save_files)
         layout.addWidget(self.batch_save_button)
-        
-        # Signal to detect changes in the table cells
-        self.table.itemChanged.connect(self.on_item_changed)
+
         self.setLayout(layout)
 
     def select_custom_directory(self):
@@ -71,44 +198,29 @@ class BlenderDirectoryExplorer(QWidget):
 
         print(f"[DEBUG] Custom save directory: {self.custom_save_dir.text()}")
 
-        # Iterate through the table rows to check for selected files
-        for row in range(self.table.rowCount()):
-            # Debug: Indicate which row is being processed
-            print(f"[DEBUG] Processing row {row}")
-
-            # Get the checkbox in the first column
-            check_box = self.table.item(row, 0)
-            if check_box is None:
-                print(f"[DEBUG] No checkbox found in row {row}")
-                continue
-            
-            # Debug: Check if the checkbox is checked
-            if check_box.checkState() == Qt.Checked:
-                print(f"[DEBUG] Checkbox in row {row} is checked.")
-            else:
-                print(f"[DEBUG] Checkbox in row {row} is not checked.")
-                continue
-
-            # Get the file name from the second column
-            file_name_item = self.table.item(row, 2)
-            if file_name_item is None:
-                print(f"[DEBUG] No file name found in row {row}")
-                continue
-
-            file_name = file_name_item.text()
-            print(f"[DEBUG] File name in row {row}: {file_name}")
-
-            # Check if the file name exists in the save settings
-            if file_name in self.save_settings:
-                settings = self.save_settings[file_name]
+        # Iterate through the checked rows of the model (filtered out rows too).
+        # Per row timings are in the trace (see tracing.py), not on stdout.
+        entries = []
+        unchanged = 0
+        with span("collect_saves") as collect:
+            for row in self.model.checked_rows():
+                # Only the edited fields are written, files without edits
+                # are not opened at all
+                changes = self.model.changes_for(row)
+                if not changes:
+                    unchanged += 1
+                    continue
+                file_name = os.path.basename(self.model.paths[row])
                 file_path = os.path.join(self.custom_save_dir.text(), file_name)
-                
-                # Debug: Show file path and settings being saved
-                print(f"[DEBUG] Saving file {file_name} to {file_path} with settings: {settings}")
-                self.save_blend_file(file_path, file_name)
-            else:
-                print(f"[DEBUG] No settings found for file {file_name}")
+                try:
+                    entries.append(save_entry(self.model.paths[row], file_path, changes))
+                except ProtocolError as e:
+                    print(f"Not saving {file_name}: {str(e)}")
+            collect.set(files=len(entries), unchanged=unchanged)
+        print(f"Saving {len(entries)} files to {self.custom_save_dir.text()}, {unchanged} without changes skipped")
 
+        # A few Blender sessions save the whole selection between them
+        self.run_saves(entries)
 
     def open_directory_dialog(self):
         dir_path = QFileDialog.getExistingDirectory(
@@ -118,167 +230,495 @@ class BlenderDirectoryExplorer(QWidget):
             self.dir_label.setText(f"Selected directory: {dir_path}")
             self.load_blend_files_in_directory(dir_path)
 
+    def scan_options(self):
+        depth = self.depth_spin.value()
+        return {
+            "include": split_patterns(self.include_edit.text()) or DEFAULT_INCLUDE,
+            "exclude": split_patterns(self.exclude_edit.text()),
+            "max_depth": None if depth < 0 else depth,
+        }
+
     def load_blend_files_in_directory(self, dir_path):
-        blend_files = [f for f in os.listdir(dir_path) if f.endswith(".blend")]
-        if not blend_files:
-            self.table.setRowCount(0)
-            self.table.setHorizontalHeaderLabels(["Select", "File Name", "Scenes", "Objects", "Render Samples"])
+        # Stop a scan of the previously opened directory, its rows are gone
+        self.stop_watching()
+        # The rows are cleared right after
+        self.cancel_scan(remove_pending=False)
+        self.model.clear()
+        self.dir_path = dir_path
+        self.snapshot = {}
+        self.directories = set()
+        self.pending_changes = set()
+        self.start_scan(ScanThread(
+            dir_path, self.scan_options(), None,
+            self.scheduler, self.loader_pool, self.metadata_cache, self,
+            service=self.service_client()
+        ))
+
+    def service_client(self):
+        # Service mode: settings and thumbnails come from scan_service.py
+        url = self.service_edit.text().strip()
+        return ServiceClient(url) if url else None
+
+    def start_scan(self, scan_thread):
+        workers = self.workers_spin.value()
+        self.loader_pool.size = workers
+        self.scheduler.set_lane_size("metadata", workers)
+        self.scheduler.set_lane_size("thumbnail", max(1, workers // 2))
+        self.scan_thread = scan_thread
+        self.scan_thread.file_found.connect(self.add_pending_row)
+        self.scan_thread.file_loaded.connect(self.add_file_row)
+        self.scan_thread.thumbnail_loaded.connect(self.on_thumbnail_loaded)
+        self.scan_thread.file_failed.connect(self.add_failed_row)
+        self.scan_thread.progress.connect(self.on_scan_progress)
+        self.scan_thread.finished.connect(self.on_scan_finished)
+        self.scan_thread.finished.connect(self.scan_thread.deleteLater)
+
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.cancel_button.setEnabled(True)
+        self.scan_thread.start()
+
+    def cancel_scan(self, remove_pending=True):
+        # Queued files are dropped and running renders killed. Does not wait
+        # for files that are already being loaded, their results are simply
+        # dropped once they arrive
+        if self.scan_thread is None:
             return
+        self.scan_thread.cancel()
+        self.scan_thread = None
+        if remove_pending:
+            # Files that never got their settings
+            self.model.remove_pending()
+        self.reset_scan_ui()
 
-        self.table.setRowCount(len(blend_files))
+    def is_stale_scan_signal(self):
+        # Threads of cancelled scans keep running until their current files
+        # are done, whatever they still send is no longer ours
+        return self.sender() is not self.scan_thread
 
-        for row, blend_file in enumerate(blend_files):
-            file_path = os.path.join(dir_path, blend_file)
-            result = subprocess.run(
-                ["python", "blender_loader.py", file_path],
-                capture_output=True,
-                text=True
-            )
+    def on_scan_progress(self, done, total, walking):
+        if self.is_stale_scan_signal():
+            return
+        # The total keeps growing while the tree is still being walked
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+        self.progress_bar.setFormat(f"%v / {total}{'+' if walking else ''} files")
 
-            if result.returncode == 0:
-                file_info = result.stdout.split('_Result')
-                preview_path = os.path.join(dir_path, f"{os.path.splitext(blend_file)[0]}.blend_thumbnail.png")
-                # Generate thumbnail image
-                
-                try:
-                    json_file_info = eval(file_info[1])
-                except json.JSONDecodeError as e:
-                    print(f"Error parsing JSON: {str(e)}")
-                    continue
-                self.table.setColumnCount(len(json_file_info.keys()) + 3)  # +2 for the buttons
-                self.table.setHorizontalHeaderLabels(["Select",] +list(json_file_info.keys()) + ["Save File","Preview"])
-                file_name= json_file_info.get('FileName')
-                check_box = QTableWidgetItem()
-                check_box.setFlags(Qt.ItemIsUserCheckable | Qt.ItemIsEnabled)
-                check_box.setCheckState(Qt.Unchecked)
-                self.table.setItem(row, 0, check_box)
-                self.save_settings[file_name] = json_file_info
-                # Fill in the data from the JSON info
-                for idx, data in enumerate(json_file_info.keys()):
-                    value = json_file_info.get(data)
-
-                    # Create a dropdown if the value is boolean (True/False)
-                    if (value == "FFMPEG"):
-                        combo_box = QComboBox()
-                        combo_box.addItems(["FFMPEG", "PNG"])
-                        combo_box.setCurrentText("FFMPEG" if value else "PNG")
-                        combo_box.currentIndexChanged.connect(
-                            lambda index, file_name=file_name, key=data: self.on_combo_box_format_changed(file_name, key, index)
-                        )
-                        self.table.setCellWidget(row, idx+1, combo_box)
-                    if isinstance(value, bool):
-                        combo_box = QComboBox()
-                        combo_box.addItems(["True", "False"])
-                        combo_box.setCurrentText("True" if value else "False")
-                        combo_box.currentIndexChanged.connect(
-                            lambda index, file_name=file_name, key=data: self.on_combo_box_changed(file_name, key, index)
-                        )
-                        self.table.setCellWidget(row, idx+1, combo_box)
-                    else:
-                        self.table.setItem(row, idx+1, QTableWidgetItem(str(value)))
-                modified_blend_file_path = str(json_file_info.get('FilePath'))
-
-                # Add the "Save File" button
-                save_file_button = QPushButton("Save File", self)
-                settings = self.save_settings[file_name]
-                save_file_button.clicked.connect(lambda _, path=modified_blend_file_path, file_name=file_name: self.save_blend_file(path, file_name))
-                self.table.setCellWidget(row, len(json_file_info.keys()) + 1, save_file_button)
-                
-                pix = self.generate_thumbnail(file_path, preview_path)
-                preview_label = QLabel()
-                preview_label.setPixmap(pix.scaled(64, 64, Qt.KeepAspectRatio))
-                self.table.setCellWidget(row, len(json_file_info.keys()) + 2, preview_label)
-                
-            # print(eval(file_info[1]))
-            if result.returncode != 0:
-                save_file_button = QPushButton("Save File", self)
-                save_file_button.setDisabled(True)
-                self.table.setCellWidget(row, len(json_file_info.keys()) + 1, save_file_button)
-            # print(self.save_settings)
-    
-    def on_combo_box_format_changed(self, file_name, key, index):
-        # This function handles changes to the combo box (True/False dropdown)
-        new_value = "FFMPEG" if index == 0 else "PNG"
-        self.save_settings[file_name][key] = new_value
-        print(f"Updated {file_name} - {key}: {new_value}")
-    
-    def on_combo_box_changed(self, file_name, key, index):
-        # This function handles changes to the combo box (True/False dropdown)
-        new_value = True if index == 0 else False
-        self.save_settings[file_name][key] = new_value
-        print(f"Updated {file_name} - {key}: {new_value}")
-        
-    def on_item_changed(self, item):
-        row = item.row()
-        col = item.column()
-        value = item.text()
+    def on_scan_finished(self):
+        if self.is_stale_scan_signal():
+            return
+        scan_thread = self.scan_thread
+        self.scan_thread = None
+        self.reset_scan_ui()
+        self.snapshot.update(scan_thread.snapshot)
+        if scan_thread.file_paths is None:
+            self.directories = set(scan_thread.directories)
+            if self.watch_check.isChecked():
+                self.start_watching(self.directories)
+        if self.pending_changes:
+            self.load_changed_files([])
+
+    def on_watch_toggled(self, checked):
+        if not checked:
+            self.stop_watching()
+        elif self.dir_path and self.scan_thread is None:
+            # The files are in the snapshot, the directories are known from
+            # the last full scan. After a cancelled scan only the root is
+            # watched, a change in it rescans the whole tree below.
+            self.start_watching(self.directories or {self.dir_path})
+
+    def start_watching(self, directories):
+        self.stop_watching()
+        self.watcher = DirectoryWatcher(
+            self.dir_path, directories, self.snapshot, self.scan_options(), self
+        )
+        self.watcher.changed.connect(self.on_files_changed)
 
-        # Debugging information
-        print(f"Item changed: Row {row}, Column {col}, New Value: {value}")
+    def stop_watching(self):
+        if self.watcher is not None:
+            # Including the ones created while watching, without the ones
+            # removed meanwhile
+            self.directories.update(self.watcher.directories())
+            self.directories = {path for path in self.directories if os.path.isdir(path)}
+            self.watcher.stop()
+            self.watcher.deleteLater()
+            self.watcher = None
+
+    def on_files_changed(self, added, modified, deleted):
+        for file_path in deleted:
+            self.snapshot.pop(file_path, None)
+            self.pending_changes.discard(file_path)
+            self.metadata_cache.invalidate(file_path)
+            self.model.remove_file(file_path)
+        self.load_changed_files(added + modified)
+
+    def load_changed_files(self, file_paths):
+        # Only the added and modified files are extracted again. Changes that
+        # come in while a scan is running are picked up when it finishes.
+        self.pending_changes.update(file_paths)
+        if self.scan_thread is not None or not self.pending_changes:
+            return
+        file_paths = sorted(self.pending_changes)
+        self.pending_changes = set()
+        self.start_scan(ScanThread(
+            self.dir_path, None, file_paths,
+            self.scheduler, self.loader_pool, self.metadata_cache, self,
+            service=self.service_client()
+        ))
+
+    def reset_scan_ui(self):
+        self.cancel_button.setEnabled(False)
+        self.progress_bar.hide()
+
+    def schedule_visible_update(self, *args):
+        if not self.visible_timer.isActive():
+            self.visible_timer.start()
+
+    def prioritize_visible_rows(self):
+        if self.scan_thread is None:
+            return
+        first = self.table.rowAt(0)
+        if first < 0:
+            return
+        last = self.table.rowAt(self.table.viewport().height() - 1)
+        if last < 0:
+            last = self.proxy.rowCount() - 1
+        rows = (self.proxy.mapToSource(self.proxy.index(row, 0)).row() for row in range(first, last + 1))
+        self.scan_thread.prioritize([self.model.paths[row] for row in rows])
+
+    def add_pending_row(self, file_path):
+        if self.is_stale_scan_signal():
+            return
+        self.model.add_pending(file_path)
+
+    def add_failed_row(self, file_path, error):
+        if self.is_stale_scan_signal():
+            return
+        print(f"Failed to load {file_path}: {error}")
+        self.model.mark_failed(file_path, error)
 
-        # Ensure the row is valid and the table has items
-        if row < 0 or col < 0 or row >= self.table.rowCount() or col >= self.table.columnCount():
-            print(f"Invalid row or column index: Row {row}, Column {col}")
+    def add_file_row(self, file_path, json_file_info):
+        # Called on the GUI thread for every file the scan thread finished.
+        # Rows are keyed by path, file names repeat across sub directories.
+        if self.is_stale_scan_signal():
             return
+        with span("table_update", file_path):
+            self.model.upsert_file(file_path, json_file_info)
 
-        # Get the file name from column 0
-        file_name_item = self.table.item(row, 2)
-        if file_name_item:
-            file_name = file_name_item.text()
-            if file_name in self.save_settings:
-                column_key = self.table.horizontalHeaderItem(col).text()
-                if column_key in self.save_settings[file_name]:
-                    self.save_settings[file_name][column_key] = value
-                    # print(f"Updated {file_name} - {column_key}: {value}")
-        #         else:
-        #             print(f"Column key {column_key} not found in save settings.")
-        #     else:
-        #         print(f"File name {file_name} not found in save settings.")
-        # else:
-        #     print(f"File name item not found for row {row}.")
-
-    def save_settings_button(self, row):
-        # Get the data from the table and save the settings
-        file_name_item = self.table.item(row, 0)  # Assuming the file name is in column 0
-        if file_name_item:
-            file_name = file_name_item.text()
-            if file_name in self.save_settings:
-                # Save settings for the corresponding file
-                settings = self.save_settings[file_name]
-                print(f"Saving settings for {file_name}: {settings}")        
-                
-    def save_blend_file(self, file_path, file_name):
+    def on_thumbnail_loaded(self, file_path, preview_path):
+        if self.is_stale_scan_signal() or preview_path is None:
+            return
+        self.model.set_preview(file_path, preview_path)
+
+    def on_value_edited(self, file_path, key, value):
+        print(f"Updated {os.path.basename(file_path)} - {key}: {value}")
+
+    def save_blend_file(self, file_path):
+        # Save File writes the edited settings back into the file itself
+        row = self.model.row_of(file_path)
+        if row is None:
+            return
+        changes = self.model.changes_for(row)
+        if not changes:
+            print(f"Nothing changed in {os.path.basename(file_path)}, not saving")
+            return
         try:
-            # Define a temporary file path for saving the modified .blend file
-            settings = self.save_settings[file_name]
-            print(settings)
-            result = subprocess.run(
-                ["python", "blender_save_script.py",file_path, str(settings)],
-                capture_output=True,
-                text=True
+            self.run_saves([save_entry(file_path, file_path, changes)])
+        except ProtocolError as e:
+            print(f"Not saving {os.path.basename(file_path)}: {str(e)}")
+
+    def run_saves(self, entries):
+        if not entries:
+            return
+        if self.save_job is not None:
+            print("A save is still running, try again when it is done.")
+            return
+        workers = self.workers_spin.value()
+
+        def save(job):
+            return run_save_batch(
+                entries, workers, self.save_signals.file_saved.emit, SAVE_TIMEOUT, on_process=job.track
             )
 
-            if result.returncode == 0:
-                print(f"File saved to {file_path}")
+        def done(job, records, error):
+            self.save_signals.finished.emit("" if error is None else str(error))
+
+        try:
+            self.save_job = self.scheduler.submit("save", object(), save, on_done=done)
+        except JobCancelled:
+            return
+        self.batch_save_button.setEnabled(False)
+
+    def on_file_saved(self, record):
+        if record.get("ok"):
+            print(f"File saved to {record['output']}")
+            if record["output"] == record["source"]:
+                self.model.mark_saved(record["source"])
+        else:
+            print(f"Failed to save {record['output']}: {record.get('error')}")
+
+    def on_saves_finished(self, error):
+        if error:
+            print(f"Save failed: {error}")
+        self.save_job = None
+        self.batch_save_button.setEnabled(True)
+
+
+class ScanThread(QThread):
+    # Walks the tree under `dir_path` with `scan_options` (or takes an
+    # explicit list of `file_paths`, watch mode rescans) and queues every
+    # file on the job scheduler: settings in the "metadata" lane, then the
+    # thumbnail in the "thumbnail" lane. Results reach the GUI thread one
+    # file at a time; the thread finishes when all jobs are done.
+    file_found = Signal(str)
+    file_loaded = Signal(str, object)
+    thumbnail_loaded = Signal(str, object)
+    file_failed = Signal(str, str)
+    progress = Signal(int, int, bool)
+
+    def __init__(self, dir_path, scan_options, file_paths, scheduler, loader_pool, metadata_cache, parent=None, service=None):
+        super().__init__(parent)
+        # A service_client.ServiceClient replaces the pool, cache and renders
+        self.service = service
+        self.dir_path = dir_path
+        self.scan_options = scan_options
+        self.file_paths = file_paths
+        self.scheduler = scheduler
+        self.loader_pool = loader_pool
+        self.metadata_cache = metadata_cache
+        self.cancel_event = threading.Event()
+        # Filled while scanning, read by the GUI thread once finished
+        self.snapshot = {}
+        self.directories = set()
+        self.found = 0
+        self.walking = False
+        # Files whose settings or thumbnail are still queued or running
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self.loaded = 0
+        self.all_done = threading.Event()
+
+    def cancel(self):
+        # Drops what is still queued and kills running renders of this scan
+        self.cancel_event.set()
+        self.scheduler.cancel_group(self)
+        self.all_done.set()
+
+    def prioritize(self, file_paths):
+        # e.g. the rows in view, their settings and thumbnails come next
+        keys = [(self, file_path) for file_path in file_paths]
+        self.scheduler.prioritize("metadata", keys, PRIORITY_VISIBLE)
+        self.scheduler.prioritize("thumbnail", keys, PRIORITY_VISIBLE)
+
+    def load_metadata(self, job):
+        # Take the signature first, a save during the load shows up as a change
+        file_path = job.key[1]
+        with span("load_file", file_path):
+            signature = file_signature(file_path)
+            if self.service is not None:
+                settings = self.service.load_render_settings(file_path)
             else:
-                print(f"Error: {result.stderr}")
-        except Exception as e:
-            print(f"Failed to save Blender file: {str(e)}")
-            
-    def generate_thumbnail(self, blend_file, preview_path):
-        # Call the Blender script to generate a thumbnail
-        if os.path.exists(preview_path):
-            return QPixmap(preview_path)
-        
-        result = subprocess.run(
-            ["python", "render_thumbnail.py", blend_file, os.path.dirname(preview_path)],
-            check=True
-        )
-        # print(result)
-        if os.path.exists(preview_path) and result.returncode == 0:
-            return QPixmap(preview_path)
+                try:
+                    settings = load_render_settings(
+                        file_path, self.loader_pool, self.metadata_cache, timeout=LOAD_TIMEOUT
+                    )
+                except LoaderTimeout as e:
+                    raise JobTimeout(str(e))
+            if signature is not None:
+                self.snapshot[file_path] = signature
+        return settings
+
+    def load_thumbnail(self, job):
+        file_path = job.key[1]
+        if self.service is not None:
+            return self.service.ensure_thumbnail(file_path)
+        # Reading a big file for its digest is part of the job: it stops
+        # when the job is cancelled or runs out of time
+        digest = self.metadata_cache.content_hash(file_path, stop=lambda: job.cancelled or job.timed_out)
+        if digest is None:
+            return None
+        return ensure_thumbnail(file_path, thumbnail_path_for(file_path, digest=digest), on_process=job.track)
+
+    def on_metadata_done(self, job, settings, error):
+        # Scheduler thread
+        file_path = job.key[1]
+        thumbnail_queued = False
+        if error is not None:
+            self.file_failed.emit(file_path, str(error))
+        else:
+            self.file_loaded.emit(file_path, settings)
+            # Same priority as the settings had, visible rows stay first
+            try:
+                self.scheduler.submit(
+                    "thumbnail", job.key, self.load_thumbnail, job.priority,
+                    timeout=RENDER_BUDGET + STARTUP_GRACE, group=self, on_done=self.on_thumbnail_done,
+                )
+                thumbnail_queued = True
+            except JobCancelled:
+                pass
+        with self.lock:
+            self.loaded += 1
+            loaded = self.loaded
+        self.progress.emit(loaded, self.found, self.walking)
+        if not thumbnail_queued:
+            self.finish_file()
+
+    def on_thumbnail_done(self, job, preview_path, error):
+        file_path = job.key[1]
+        if error is not None:
+            print(f"No thumbnail for {file_path}: {str(error)}")
         else:
-            raise FileNotFoundError(f"Thumbnail not found at {preview_path}")
+            self.thumbnail_loaded.emit(file_path, preview_path)
+        self.finish_file()
+
+    def finish_file(self):
+        with self.lock:
+            self.outstanding -= 1
+            if self.outstanding == 0 and not self.walking:
+                self.all_done.set()
+
+    def iter_file_paths(self):
+        if self.file_paths is not None:
+            return self.file_paths
+        return iter_blend_files(self.dir_path, visit_dir=self.directories.add, **self.scan_options)
+
+    def run(self):
+        with span("scan", self.dir_path) as scan:
+            self.walking = True
+            for file_path in self.iter_file_paths():
+                if self.cancel_event.is_set():
+                    break
+                self.found += 1
+                self.file_found.emit(file_path)
+                with self.lock:
+                    self.outstanding += 1
+                try:
+                    self.scheduler.submit(
+                        "metadata", (self, file_path), self.load_metadata, PRIORITY_NORMAL,
+                        timeout=LOAD_TIMEOUT + 5, retries=LOAD_RETRIES, group=self,
+                        on_done=self.on_metadata_done,
+                    )
+                except JobCancelled:
+                    break
+            with self.lock:
+                self.walking = False
+                if self.outstanding == 0:
+                    self.all_done.set()
+            self.progress.emit(self.loaded, self.found, False)
+            self.all_done.wait()
+            scan.set(files=self.loaded, cancelled=self.cancel_event.is_set())
+        if self.file_paths is None and not self.cancel_event.is_set():
+            self.metadata_cache.prune(self.dir_path)
+            if self.service is None:
+                prune_thumbnails()
+
+
+class SaveSignals(QObject):
+    # Hands the results of the save job (a scheduler thread) to the GUI thread
+    file_saved = Signal(object)
+    finished = Signal(str)
+
+
+class DirectoryWatcher(QObject):
+    # Reports added, modified and deleted .blend files below `root`. Uses
+    # QFileSystemWatcher (inotify, ReadDirectoryChangesW, ...) on the
+    # scanned directories and only rescans the ones that changed. The
+    # directories the system refuses to watch (e.g. past the inotify limit)
+    # are rescanned every POLL_INTERVAL instead.
+    changed = Signal(list, list, list)
+
+    def __init__(self, root, directories, snapshot, scan_options, parent=None):
+        super().__init__(parent)
+        self.root = root
+        self.snapshot = dict(snapshot)
+        self.scan_options = scan_options
+        self.changed_dirs = set()
+        self.polled_dirs = set()
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+        # Blender saves through a temp file and a rename, wait for it to settle
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(500)
+        self.debounce.timeout.connect(self.rescan_changed_dirs)
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(POLL_INTERVAL)
+        self.poll_timer.timeout.connect(self.poll_dirs)
+        self.watch_directories(directories)
+
+    def directories(self):
+        # Watched or polled
+        return set(self.watcher.directories()) | self.polled_dirs
+
+    def watch_directories(self, directories):
+        # Directories removed since they were walked cannot be watched, a
+        # change in their parent reports their files
+        watched = set(self.watcher.directories())
+        directories = [path for path in directories if path not in watched and os.path.isdir(path)]
+        if not directories:
+            return
+        failed = set(self.watcher.addPaths(directories))
+        # Polled ones are tried again on every poll, some may work by now
+        self.polled_dirs.difference_update(set(directories) - failed)
+        new_failures = failed - self.polled_dirs
+        if new_failures:
+            print(f"Could not watch {len(new_failures)} directories, polling them for changes instead")
+        self.polled_dirs |= failed
+        if self.polled_dirs and not self.poll_timer.isActive():
+            self.poll_timer.start()
+
+    def stop(self):
+        self.debounce.stop()
+        self.poll_timer.stop()
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+
+    def poll_dirs(self):
+        # A removed directory is rescanned once more, that reports its files
+        # as deleted, then dropped
+        self.changed_dirs |= self.polled_dirs
+        self.polled_dirs = {path for path in self.polled_dirs if os.path.isdir(path)}
+        if not self.polled_dirs:
+            self.poll_timer.stop()
+        self.rescan_changed_dirs()
+
+    def on_directory_changed(self, dir_path):
+        self.changed_dirs.add(dir_path)
+        self.debounce.start()
+
+    def rescan_changed_dirs(self):
+        changed_dirs, self.changed_dirs = self.changed_dirs, set()
+        added, modified, deleted = [], [], []
+        for dir_path in self.top_level(changed_dirs):
+            prefix = os.path.join(dir_path, "")
+            old = {path: sig for path, sig in self.snapshot.items() if path.startswith(prefix)}
+            directories = set()
+            new = take_snapshot(iter_blend_files(
+                self.root, visit_dir=directories.add, subdir=dir_path, **self.scan_options
+            ))
+            dir_added, dir_modified, dir_deleted = diff_snapshots(old, new)
+            added += dir_added
+            modified += dir_modified
+            deleted += dir_deleted
+            for path in dir_deleted:
+                del self.snapshot[path]
+            self.snapshot.update(new)
+            # New sub directories have to be watched as well
+            self.watch_directories(directories)
+        if added or modified or deleted:
+            self.changed.emit(added, modified, deleted)
+
+    def top_level(self, dir_paths):
+        # A rescan walks the whole sub tree, skip directories inside another one
+        dir_paths = sorted(dir_paths)
+        result = []
+        for dir_path in dir_paths:
+            if not any(dir_path.startswith(os.path.join(parent, "")) for parent in result):
+                result.append(dir_path)
+        return result
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
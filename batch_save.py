@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import tempfile
+import threading
+import subprocess
+from ipc import RecordReader, ProtocolError, normalize_settings
+from tracing import span
+from process_tree import group_options, kill_process_tree
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+SAVE_SCRIPT = os.path.join(script_dir, "blender_save_script.py")
+
+
+def save_entry(source, output, settings):
+    # One item of a blender_save_script.py --manifest batch. Raises
+    # ipc.ProtocolError for settings that do not fit the schema.
+    return {"source": source, "output": output, "settings": normalize_settings(settings)}
+
+
+def split_entries(entries, workers):
+    # Round robin, so every worker gets a similar mix of files
+    workers = max(1, min(workers, len(entries)))
+    return [entries[i::workers] for i in range(workers)]
+
+
+class _Deadline:
+    # Kills `process` when it stays quiet for `timeout` seconds. Restarted
+    # for every record, so it limits the time per file, not per batch.
+
+    def __init__(self, process, timeout):
+        self.process = process
+        self.timeout = timeout
+        self.expired = False
+        self.timer = None
+
+    def _expire(self):
+        self.expired = True
+        kill_process_tree(self.process)
+
+    def restart(self):
+        self.cancel()
+        if self.timeout:
+            self.timer = threading.Timer(self.timeout, self._expire)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def cancel(self):
+        if self.timer is not None:
+            self.timer.cancel()
+
+
+def _run_chunk(entries, on_result, timeout=None, on_process=None):
+    records = []
+    fd, manifest_path = tempfile.mkstemp(prefix="blender_save_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        try:
+            process = subprocess.Popen(
+                [sys.executable, SAVE_SCRIPT, "--manifest", manifest_path],
+                stdout=subprocess.PIPE,
+                cwd=script_dir,
+                **group_options(),
+            )
+        except OSError as e:
+            error = f"Could not start save worker: {e}"
+        else:
+            error = None
+            if on_process is not None:
+                on_process(process)
+            deadline = _Deadline(process, timeout)
+            deadline.restart()
+            try:
+                for message in RecordReader(process.stdout):
+                    deadline.restart()
+                    if message["type"] not in ("result", "error"):
+                        continue
+                    record = {
+                        "source": message.get("source"),
+                        "output": message.get("output"),
+                        "ok": message["type"] == "result",
+                    }
+                    if not record["ok"]:
+                        record["error"] = message.get("message")
+                    records.append(record)
+                    on_result(record)
+            except ProtocolError as e:
+                error = f"Save worker sent garbage: {e}"
+                kill_process_tree(process)
+            process.wait()
+            deadline.cancel()
+            if deadline.expired:
+                error = f"Saving took longer than {timeout}s"
+            error = error or f"Save worker exited with code {process.returncode}"
+    finally:
+        os.remove(manifest_path)
+
+    # Entries the worker never got to (it crashed) are failures too
+    done = {(record["source"], record["output"]) for record in records}
+    for entry in entries:
+        if (entry["source"], entry["output"]) not in done:
+            record = {
+                "source": entry["source"],
+                "output": entry["output"],
+                "ok": False,
+                "error": error,
+            }
+            records.append(record)
+            on_result(record)
+    return records
+
+
+def run_save_batch(entries, workers=1, on_result=None, timeout=None, on_process=None):
+    # Save every entry with `workers` Blender processes, each of them
+    # working through its share of the batch in one session. on_result is
+    # called (from a worker thread) with one record per file as it is saved.
+    # A worker that spends more than `timeout` seconds on one file is killed,
+    # its remaining files are reported as failed. on_process gets every
+    # Blender process started, e.g. so a job scheduler can cancel them.
+    if not entries:
+        return []
+    if on_result is None:
+        on_result = lambda record: None
+    lock = threading.Lock()
+    records = []
+
+    def report(record):
+        with lock:
+            records.append(record)
+            on_result(record)
+
+    threads = [
+        threading.Thread(target=_run_chunk, args=(chunk, report, timeout, on_process), daemon=True)
+        for chunk in split_entries(entries, workers)
+    ]
+    with span("save_batch", files=len(entries), workers=len(threads)):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return records
@@ -0,0 +1,385 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+# Times the scan, thumbnail and save paths on a generated corpus (see
+# generate_corpus.py) at several corpus sizes:
+#
+#   python benchmark.py --corpus bench_corpus --sizes 10,100,1000 -o results.json
+#   python benchmark.py --corpus bench_corpus --sizes 100 --compare results.json
+#
+# Every phase runs in a child process of its own, so its peak RSS (that of
+# the child or of the largest Blender process it started) is not mixed up
+# with the other phases. Results are JSON, one record per size and phase.
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+GENERATOR_SCRIPT = os.path.join(script_dir, "generate_corpus.py")
+LOADER_SCRIPT = os.path.join(script_dir, "blender_loader.py")
+RENDER_SCRIPT = os.path.join(script_dir, "render_thumbnail.py")
+
+RESULTS_VERSION = 1
+# generate_corpus.CORPUS_VERSION, that script only runs inside Blender
+CORPUS_VERSION = 2
+DEFAULT_SIZES = [10, 100, 1000]
+
+# reader       blend_reader.read_render_settings, in process
+# load         blender_loader.load_blend_file, one Blender process per file
+# load_pool    resident loader workers (worker_pool.LoaderPool)
+# thumbnail    render_thumbnail.render_thumbnail, preview profile
+# save         blender_save_script.save_blend_file, batched sessions
+# scan         end to end directory load like the explorer, cold cache
+# scan_warm    the same again with the cache of the cold scan
+PHASES = ["reader", "load", "load_pool", "thumbnail", "save", "scan", "scan_warm"]
+
+
+def ensure_corpus(corpus_dir, count, seed):
+    # Generates the files once, every size uses the first N of them
+    master_dir = os.path.join(corpus_dir, "master")
+    manifest_path = os.path.join(master_dir, "corpus.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if (
+            manifest.get("version") == CORPUS_VERSION
+            and len(manifest["files"]) >= count
+            and manifest["seed"] == seed
+        ):
+            return manifest
+    subprocess.run(
+        [sys.executable, GENERATOR_SCRIPT, master_dir, "--count", str(count), "--seed", str(seed)],
+        cwd=script_dir, check=True,
+    )
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def corpus_subset(corpus_dir, manifest, size):
+    # Directory with exactly `size` files, hard links where possible
+    master_dir = os.path.join(corpus_dir, "master")
+    size_dir = os.path.join(corpus_dir, f"n{size}")
+    names = [params["name"] for params in manifest["files"][:size]]
+    if os.path.isdir(size_dir) and sorted(
+        name for name in os.listdir(size_dir) if name.endswith(".blend")
+    ) == sorted(names):
+        return size_dir
+    shutil.rmtree(size_dir, ignore_errors=True)
+    os.makedirs(size_dir)
+    for name in names:
+        source, target = os.path.join(master_dir, name), os.path.join(size_dir, name)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+    return size_dir
+
+
+def timed(function, file_path):
+    start = time.perf_counter()
+    try:
+        function(file_path)
+        error = None
+    except Exception as e:
+        error = str(e)
+    return time.perf_counter() - start, error
+
+
+def run_sequential(file_paths, function):
+    durations, failed = [], 0
+    for file_path in file_paths:
+        duration, error = timed(function, file_path)
+        durations.append(duration)
+        failed += error is not None
+    return durations, failed
+
+
+def run_parallel(file_paths, function, workers):
+    from directory_scan import scan_files
+    durations, failed = [], 0
+    for _, result, error in scan_files(file_paths, lambda path: timed(function, path), workers):
+        if error is not None:
+            failed += 1
+            continue
+        duration, file_error = result
+        durations.append(duration)
+        failed += file_error is not None
+    return durations, failed
+
+
+def run_blender(args, timeout):
+    subprocess.run(
+        [sys.executable] + args, cwd=script_dir, check=True, timeout=timeout,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def phase_reader(dir_path, file_paths, work_dir, options):
+    from blend_reader import read_render_settings
+    return run_sequential(file_paths, read_render_settings)
+
+
+def phase_load(dir_path, file_paths, work_dir, options):
+    return run_sequential(
+        file_paths, lambda path: run_blender([LOADER_SCRIPT, path], options["timeout"])
+    )
+
+
+def phase_load_pool(dir_path, file_paths, work_dir, options):
+    from worker_pool import LoaderPool
+    loader_pool = LoaderPool(size=options["workers"])
+    try:
+        # Workers start on their first file, that is part of the cost
+        return run_parallel(
+            file_paths, lambda path: loader_pool.load(path, timeout=options["timeout"]), options["workers"]
+        )
+    finally:
+        loader_pool.close()
+
+
+def phase_thumbnail(dir_path, file_paths, work_dir, options):
+    return run_sequential(file_paths, lambda path: run_blender(
+        [RENDER_SCRIPT, path, work_dir, "--profile", "preview", "--budget", str(options["timeout"])],
+        options["timeout"] * 2,
+    ))
+
+
+def phase_save(dir_path, file_paths, work_dir, options):
+    from batch_save import save_entry, run_save_batch
+    entries = []
+    for file_path in file_paths:
+        entries.append(save_entry(
+            file_path, os.path.join(work_dir, os.path.basename(file_path)), {"Resolution_Percentage": 50}
+        ))
+    # Per file times come from the gaps between results of one session
+    last = {}
+    durations, failed = [], 0
+    start = time.perf_counter()
+
+    def on_result(record):
+        nonlocal failed
+        now = time.perf_counter()
+        durations.append(now - last.get("time", start))
+        last["time"] = now
+        failed += not record["ok"]
+
+    run_save_batch(entries, options["workers"], on_result, options["timeout"])
+    return durations, failed
+
+
+def phase_scan(dir_path, file_paths, work_dir, options):
+    # What ScanThread does for every file, minus Qt
+    from worker_pool import LoaderPool, load_render_settings
+    from metadata_cache import MetadataCache
+    from thumbnails import thumbnail_path_for, ensure_thumbnail
+    from directory_scan import iter_blend_files
+    cache_path = os.path.join(options["state_dir"], "metadata.sqlite3")
+    thumbnail_dir = os.path.join(options["state_dir"], "thumbnails")
+    if options["phase"] == "scan":
+        shutil.rmtree(thumbnail_dir, ignore_errors=True)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+    loader_pool = LoaderPool(size=options["workers"])
+    metadata_cache = MetadataCache(cache_path)
+
+    def load(file_path):
+        load_render_settings(file_path, loader_pool, metadata_cache, options["timeout"])
+        preview_path = thumbnail_path_for(file_path, thumbnail_dir, metadata_cache.content_hash(file_path))
+        ensure_thumbnail(file_path, preview_path, options["timeout"])
+
+    try:
+        return run_parallel(iter_blend_files(dir_path), load, options["workers"])
+    finally:
+        loader_pool.close()
+        metadata_cache.close()
+
+
+PHASE_FUNCTIONS = {
+    "reader": phase_reader,
+    "load": phase_load,
+    "load_pool": phase_load_pool,
+    "thumbnail": phase_thumbnail,
+    "save": phase_save,
+    "scan": phase_scan,
+    "scan_warm": phase_scan,
+}
+
+
+def run_phase_child(options):
+    # Runs in the child process, sends the raw numbers as a result record.
+    # Prints of the code under test (and of Blender processes that inherit
+    # stdout) go to stderr.
+    from ipc import open_channel
+    channel = open_channel()
+    dir_path = options["dir_path"]
+    file_paths = sorted(
+        os.path.join(dir_path, name) for name in os.listdir(dir_path) if name.endswith(".blend")
+    )
+    with tempfile.TemporaryDirectory(prefix="blender_bench_") as work_dir:
+        start = time.perf_counter()
+        durations, failed = PHASE_FUNCTIONS[options["phase"]](dir_path, file_paths, work_dir, options)
+        seconds = time.perf_counter() - start
+    channel.write("result", seconds=seconds, durations=durations, failed=failed)
+
+
+def max_rss_kb(rusage):
+    # ru_maxrss is in KB on Linux, in bytes on macOS
+    return rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss
+
+
+def run_phase(options):
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--run-phase", json.dumps(options)],
+        stdout=subprocess.PIPE, cwd=script_dir,
+    )
+    from ipc import RecordReader, ProtocolError
+    try:
+        records = list(RecordReader(process.stdout))
+    except ProtocolError as e:
+        process.kill()
+        records = []
+        print(f"Phase {options['phase']} sent garbage: {e}", file=sys.stderr)
+    process.stdout.close()
+    peak_rss_kb = None
+    if hasattr(os, "wait4"):
+        # Covers the child and every process it waited for
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        peak_rss_kb = max_rss_kb(rusage)
+    else:
+        process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"Phase {options['phase']} exited with code {process.returncode}")
+    results = [record for record in records if record["type"] == "result"]
+    if not results:
+        raise RuntimeError(f"Phase {options['phase']} sent no result")
+    raw = results[-1]
+    raw["peak_rss_kb"] = peak_rss_kb
+    return raw
+
+
+def summarize(size, phase, raw):
+    durations = sorted(raw["durations"])
+    seconds = raw["seconds"]
+
+    def percentile(fraction):
+        return durations[min(len(durations) - 1, int(fraction * len(durations)))] if durations else None
+
+    return {
+        "size": size,
+        "phase": phase,
+        "files": size,
+        "failed": raw["failed"],
+        "seconds": round(seconds, 4),
+        "files_per_second": round(size / seconds, 3) if seconds else None,
+        "mean": round(statistics.fmean(durations), 4) if durations else None,
+        "median": round(statistics.median(durations), 4) if durations else None,
+        "p95": round(percentile(0.95), 4) if durations else None,
+        "max": round(durations[-1], 4) if durations else None,
+        "peak_rss_kb": raw["peak_rss_kb"],
+    }
+
+
+def git_commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=script_dir, capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout.strip() or None
+
+
+def environment(manifest, args):
+    return {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "blender": manifest.get("blender"),
+        "seed": manifest.get("seed"),
+        "workers": args.workers,
+    }
+
+
+def print_table(results, baseline=None):
+    previous = {(r["size"], r["phase"]): r for r in (baseline or {}).get("results", [])}
+    print(f"{'size':>6} {'phase':<10} {'seconds':>9} {'files/s':>9} {'median':>8} {'p95':>8} {'rss MB':>8} {'failed':>6}")
+    for result in results:
+        rss = result["peak_rss_kb"]
+        line = (
+            f"{result['size']:>6} {result['phase']:<10} {result['seconds']:>9.3f} "
+            f"{result['files_per_second'] or 0:>9.2f} {result['median'] or 0:>8.3f} "
+            f"{result['p95'] or 0:>8.3f} {(rss or 0) / 1024:>8.1f} {result['failed']:>6}"
+        )
+        old = previous.get((result["size"], result["phase"]))
+        if old and old["seconds"]:
+            line += f"  {100 * (result['seconds'] - old['seconds']) / old['seconds']:+.1f}% vs baseline"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark scanning, thumbnails and saving")
+    parser.add_argument("--corpus", default=os.path.join(script_dir, "bench_corpus"),
+                        help="where the generated .blend files are kept")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma separated corpus sizes")
+    parser.add_argument("--phases", default=",".join(PHASES), help=f"comma separated, of {', '.join(PHASES)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds per file before it counts as failed")
+    parser.add_argument("-o", "--output", default=None, help="write the results as JSON")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    parser.add_argument("--run-phase", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_phase:
+        run_phase_child(json.loads(args.run_phase))
+        return 0
+
+    sizes = sorted(int(size) for size in args.sizes.split(",") if size.strip())
+    phases = [phase.strip() for phase in args.phases.split(",") if phase.strip()]
+    unknown = set(phases) - set(PHASES)
+    if unknown:
+        parser.error(f"Unknown phases: {', '.join(sorted(unknown))}")
+    if "scan_warm" in phases and "scan" not in phases:
+        parser.error("scan_warm needs the cache of scan, add it to --phases")
+
+    manifest = ensure_corpus(args.corpus, max(sizes), args.seed)
+    results = []
+    for size in sizes:
+        dir_path = corpus_subset(args.corpus, manifest, size)
+        with tempfile.TemporaryDirectory(prefix="blender_bench_state_") as state_dir:
+            for phase in phases:
+                print(f"{size} files: {phase}", file=sys.stderr, flush=True)
+                raw = run_phase({
+                    "phase": phase, "dir_path": dir_path, "state_dir": state_dir,
+                    "workers": args.workers, "timeout": args.timeout,
+                })
+                results.append(summarize(size, phase, raw))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": RESULTS_VERSION,
+                "environment": environment(manifest, args),
+                "results": results,
+            }, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
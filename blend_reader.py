@@ -0,0 +1,752 @@
+import os
+import io
+import gzip
+import mmap
+import struct
+from collections import namedtuple
+from ipc import EEVEE_ENGINES
+
+# Pure Python reader for .blend files. It walks the block headers (BHead) and
+# decodes structs through the SDNA stored in the file itself, so no bpy is
+# needed and only the few blocks we look at are actually read from disk.
+#
+# File layout: a 12 byte header ("BLENDER", pointer size, endianness,
+# version), then blocks of BHead + data, the DNA1 block describing every
+# struct, and ENDB. Blender 5.0+ writes a longer header and 64 bit BHeads.
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Returned by StructView.get() when the file's DNA has no such field
+MISSING = object()
+
+BHead = namedtuple("BHead", ["code", "size", "old", "sdna_index", "count", "offset"])
+Field = namedtuple("Field", ["name", "type", "offset", "size", "is_pointer", "array_len"])
+
+BASIC_TYPES = {
+    "char": "b", "uchar": "B", "int8_t": "b", "uint8_t": "B",
+    "short": "h", "ushort": "H", "int16_t": "h", "uint16_t": "H",
+    "int": "i", "uint": "I", "int32_t": "i", "uint32_t": "I",
+    "float": "f", "double": "d",
+    "int64_t": "q", "uint64_t": "Q", "long": "q", "ulong": "Q",
+}
+
+
+class BlendReadError(Exception):
+    pass
+
+
+def _field_key(dna_name):
+    # "*world" -> "world", "name[66]" -> "name", "(*func)()" -> "func"
+    name = dna_name.split("[", 1)[0]
+    return name.replace("*", "").replace("(", "").replace(")", "")
+
+
+def _array_len(dna_name):
+    count = 1
+    rest = dna_name
+    while "[" in rest:
+        start = rest.index("[")
+        end = rest.index("]", start)
+        count *= int(rest[start + 1:end])
+        rest = rest[end + 1:]
+    return count
+
+
+class SDNA:
+    # Struct definitions from the DNA1 block. Offsets are computed from the
+    # type lengths in the file, the way Blender's own reader does it.
+
+    def __init__(self, data, pointer_size, endian):
+        self.pointer_size = pointer_size
+        self.endian = endian
+        offset = 0
+
+        def read_int():
+            nonlocal offset
+            value = struct.unpack_from(endian + "i", data, offset)[0]
+            offset += 4
+            return value
+
+        def expect(tag):
+            nonlocal offset
+            # Sections are 4 byte aligned
+            offset = (offset + 3) & ~3
+            if data[offset:offset + 4] != tag:
+                raise BlendReadError(f"Bad SDNA section, expected {tag!r}")
+            offset += 4
+
+        def read_strings(count):
+            nonlocal offset
+            strings = []
+            for _ in range(count):
+                end = data.index(b"\0", offset)
+                strings.append(data[offset:end].decode("ascii", "replace"))
+                offset = end + 1
+            return strings
+
+        if data[0:4] != b"SDNA":
+            raise BlendReadError("DNA1 block does not start with SDNA")
+        offset = 4
+        expect(b"NAME")
+        self.names = read_strings(read_int())
+        expect(b"TYPE")
+        self.types = read_strings(read_int())
+        expect(b"TLEN")
+        self.type_lengths = list(
+            struct.unpack_from(f"{endian}{len(self.types)}h", data, offset)
+        )
+        offset += 2 * len(self.types)
+        expect(b"STRC")
+        struct_count = read_int()
+
+        self.structs = []
+        self.struct_lengths = []
+        self.struct_index = {}
+        for index in range(struct_count):
+            type_index, field_count = struct.unpack_from(endian + "hh", data, offset)
+            offset += 4
+            fields = {}
+            field_offset = 0
+            for _ in range(field_count):
+                field_type, field_name = struct.unpack_from(endian + "hh", data, offset)
+                offset += 4
+                dna_name = self.names[field_name]
+                type_name = self.types[field_type]
+                is_pointer = dna_name.startswith("*") or dna_name.startswith("(*")
+                array_len = _array_len(dna_name)
+                if is_pointer:
+                    size = pointer_size * array_len
+                else:
+                    size = self.type_lengths[field_type] * array_len
+                fields[_field_key(dna_name)] = Field(
+                    dna_name, type_name, field_offset, size, is_pointer, array_len
+                )
+                field_offset += size
+            name = self.types[type_index]
+            self.structs.append((name, fields))
+            self.struct_lengths.append(self.type_lengths[type_index])
+            self.struct_index[name] = index
+
+    def struct(self, name):
+        index = self.struct_index.get(name)
+        if index is None:
+            return None
+        return self.structs[index]
+
+
+class StructView:
+    # Lazy view of one struct inside the file buffer
+
+    def __init__(self, blend, struct_name, fields, offset):
+        self.blend = blend
+        self.struct_name = struct_name
+        self.fields = fields
+        self.offset = offset
+
+    def has(self, name):
+        return name in self.fields
+
+    def get(self, name, default=MISSING):
+        field = self.fields.get(name)
+        if field is None:
+            return default
+        return self.blend.read_field(field, self.offset + field.offset)
+
+    def get_first(self, *names, default=MISSING):
+        # DNA field names change between Blender versions
+        for name in names:
+            value = self.get(name)
+            if value is not MISSING:
+                return value
+        return default
+
+    def __repr__(self):
+        return f"<StructView {self.struct_name} at {self.offset}>"
+
+
+class BlendHeader:
+    # The file header and the BHead layout that goes with it
+
+    def __init__(self, header, file_path):
+        if not header.startswith(b"BLENDER"):
+            raise BlendReadError(f"{file_path} is not a .blend file")
+        if header[7:9].isdigit():
+            # BLENDER17-01v0500: header size, file format version, endianness,
+            # Blender version. Format 1 uses 64 bit block sizes.
+            self.size = int(header[7:9])
+            self.format_version = int(header[10:12])
+            self.pointer_size = 8
+            endian_char = header[12:13]
+            version = header[13:self.size]
+        else:
+            self.size = 12
+            self.format_version = 0
+            self.pointer_size = 8 if header[7:8] == b"-" else 4
+            endian_char = header[8:9]
+            version = header[9:12]
+        self.endian = "<" if endian_char == b"v" else ">"
+        try:
+            version = int(version)
+        except ValueError:
+            raise BlendReadError(f"{file_path} has an unknown header {header!r}")
+        self.version = (version // 100, version % 100)
+
+        pointer = "Q" if self.pointer_size == 8 else "I"
+        if self.format_version >= 1:
+            # code, SDNAnr, old, len, nr
+            self.bhead = struct.Struct(self.endian + "4siQqq")
+            self.bhead_order = (0, 3, 2, 1, 4)
+        else:
+            # code, len, old, SDNAnr, nr
+            self.bhead = struct.Struct(self.endian + "4si" + pointer + "ii")
+            self.bhead_order = (0, 1, 2, 3, 4)
+        self.pointer_format = self.endian + pointer
+
+    def unpack_bhead(self, data, offset=0):
+        # -> code, size, old, sdna_index, count
+        values = self.bhead.unpack_from(data, offset)
+        code, size, old, sdna_index, count = (values[i] for i in self.bhead_order)
+        return code.rstrip(b"\0").decode("ascii", "replace"), size, old, sdna_index, count
+
+
+class BlendFile:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file = None
+        self._mmap = None
+        self.data = self._open(file_path)
+        try:
+            self._read_header()
+            self._read_blocks()
+        except (struct.error, ValueError, IndexError) as e:
+            self.close()
+            raise BlendReadError(f"Corrupt .blend file {file_path}: {e}")
+        except BlendReadError:
+            self.close()
+            raise
+
+    def _open(self, file_path):
+        try:
+            self._file = open(file_path, "rb")
+            magic = self._file.read(4)
+            self._file.seek(0)
+            if magic.startswith(GZIP_MAGIC):
+                with gzip.GzipFile(fileobj=self._file) as stream:
+                    return stream.read()
+            if magic == ZSTD_MAGIC:
+                return self._read_zstd(self._file)
+            if os.fstat(self._file.fileno()).st_size == 0:
+                raise BlendReadError(f"Empty file {file_path}")
+            # mmap, so only the pages of the blocks we touch are read
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mmap
+        except OSError as e:
+            self.close()
+            raise BlendReadError(f"Could not read {file_path}: {e}")
+        except BlendReadError:
+            self.close()
+            raise
+
+    def _read_zstd(self, stream):
+        try:
+            import zstandard
+        except ImportError:
+            raise BlendReadError("zstandard is needed to read compressed .blend files")
+        # Blender writes one zstd frame per chunk, read across all of them
+        reader = zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+        buffer = io.BytesIO()
+        while True:
+            chunk = reader.read(1 << 20)
+            if not chunk:
+                break
+            buffer.write(chunk)
+        return buffer.getvalue()
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read_header(self):
+        self.header = header = BlendHeader(bytes(self.data[:17]), self.file_path)
+        self.header_size = header.size
+        self.format_version = header.format_version
+        self.pointer_size = header.pointer_size
+        self.endian = header.endian
+        self.version = header.version
+        self._bhead = header.bhead
+        self._pointer_format = header.pointer_format
+
+    def _read_blocks(self):
+        self.blocks = []
+        self.blocks_by_address = {}
+        self.blocks_by_code = {}
+        offset = self.header_size
+        size = len(self.data)
+        bhead = self._bhead
+        sdna_block = None
+
+        while offset + bhead.size <= size:
+            code, block_size, old, sdna_index, count = self.header.unpack_bhead(self.data, offset)
+            block = BHead(code, block_size, old, sdna_index, count, offset + bhead.size)
+            if code == "ENDB":
+                break
+            if block_size < 0 or block.offset + block_size > size:
+                raise BlendReadError(f"Truncated block {code} in {self.file_path}")
+            self.blocks.append(block)
+            self.blocks_by_address[old] = block
+            self.blocks_by_code.setdefault(code, []).append(block)
+            if code == "DNA1":
+                sdna_block = block
+            offset = block.offset + block_size
+
+        if sdna_block is None:
+            raise BlendReadError(f"No DNA1 block in {self.file_path}")
+        self.sdna = SDNA(
+            self.data[sdna_block.offset:sdna_block.offset + sdna_block.size],
+            self.pointer_size,
+            self.endian,
+        )
+
+    def find_blocks(self, code):
+        return self.blocks_by_code.get(code, [])
+
+    def block_at(self, address):
+        if not address:
+            return None
+        return self.blocks_by_address.get(address)
+
+    def view(self, block, index=0, struct_name=None):
+        # Struct view of the index-th element stored in a block
+        struct_index = block.sdna_index
+        if struct_name is not None:
+            struct_index = self.sdna.struct_index.get(struct_name)
+            if struct_index is None:
+                return None
+        struct_name, fields = self.sdna.structs[struct_index]
+        length = self.sdna.struct_lengths[struct_index]
+        return StructView(self, struct_name, fields, block.offset + index * length)
+
+    def deref(self, address, struct_name=None):
+        block = self.block_at(address)
+        if block is None:
+            return None
+        return self.view(block, struct_name=struct_name)
+
+    def read_field(self, field, offset):
+        if field.is_pointer:
+            if field.array_len == 1:
+                return struct.unpack_from(self._pointer_format, self.data, offset)[0]
+            return list(struct.unpack_from(
+                f"{self.endian}{field.array_len}{self._pointer_format[1]}", self.data, offset
+            ))
+        if field.type == "char" and field.array_len > 1:
+            raw = bytes(self.data[offset:offset + field.size])
+            return raw.split(b"\0", 1)[0].decode("utf-8", "replace")
+        code = BASIC_TYPES.get(field.type)
+        if code is not None:
+            if field.array_len == 1:
+                return struct.unpack_from(self.endian + code, self.data, offset)[0]
+            return list(struct.unpack_from(f"{self.endian}{field.array_len}{code}", self.data, offset))
+        definition = self.sdna.struct(field.type)
+        if definition is None:
+            return MISSING
+        return StructView(self, field.type, definition[1], offset)
+
+    def id_name(self, address):
+        # ID name without the two letter type prefix ("WOWorld" -> "World")
+        view = self.deref(address)
+        if view is None:
+            return None
+        id_view = view.get("id")
+        if id_view is MISSING:
+            return None
+        return id_view.get("name", "")[2:]
+
+    def iter_listbase(self, listbase):
+        # Follow first/next pointers of a ListBase
+        seen = set()
+        address = listbase.get("first", 0)
+        while address and address not in seen:
+            seen.add(address)
+            view = self.deref(address)
+            if view is None:
+                return
+            yield view
+            address = view.get("next", 0)
+
+
+Preview = namedtuple("Preview", ["width", "height", "rgba"])
+
+
+def open_stream(file_path):
+    # Sequential reader over the uncompressed file contents
+    stream = open(file_path, "rb")
+    magic = stream.read(4)
+    stream.seek(0)
+    if magic.startswith(GZIP_MAGIC):
+        # A GzipFile does not close a fileobj it was given, let it own the file
+        stream.close()
+        return gzip.open(file_path, "rb")
+    if magic == ZSTD_MAGIC:
+        try:
+            import zstandard
+        except ImportError:
+            stream.close()
+            raise BlendReadError("zstandard is needed to read compressed .blend files")
+        return zstandard.ZstdDecompressor().stream_reader(
+            stream, read_across_frames=True, closefd=True
+        )
+    return stream
+
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise BlendReadError("Unexpected end of file")
+    return data
+
+
+def read_preview(file_path):
+    # The preview Blender stores when saving (the TEST block, up to 128x128
+    # RGBA). It is written right after the REND block at the start of the
+    # file, so only the first few KB are read, even for compressed files.
+    # Returns a Preview with rows top to bottom, or None if there is none.
+    try:
+        with open_stream(file_path) as stream:
+            raw = _read_exact(stream, 12)
+            if raw[7:9].isdigit():
+                raw += _read_exact(stream, int(raw[7:9]) - 12)
+            header = BlendHeader(raw, file_path)
+            while True:
+                code, size, _, _, _ = header.unpack_bhead(_read_exact(stream, header.bhead.size))
+                if code == "TEST":
+                    data = _read_exact(stream, size)
+                    width, height = struct.unpack_from(header.endian + "ii", data)
+                    if width <= 0 or height <= 0 or 8 + width * height * 4 > size:
+                        return None
+                    # Stored bottom row first
+                    stride = width * 4
+                    rgba = b"".join(
+                        data[8 + row * stride:8 + (row + 1) * stride]
+                        for row in reversed(range(height))
+                    )
+                    return Preview(width, height, rgba)
+                if code != "REND":
+                    return None
+                _read_exact(stream, size)
+    except (OSError, EOFError, struct.error) as e:
+        raise BlendReadError(f"Could not read the preview of {file_path}: {e}")
+
+
+# Keys of blender_loader.render_Settings, in the same order. The top level
+# describes the active scene, "All_Scenes" holds SCENE_KEYS of every scene.
+RENDER_SETTINGS_KEYS = [
+    "FilePath", "FileName", "Render_Engine", "blender_ver", "Total_Frames",
+    "Render_Samples", "Resolution_X", "Resolution_Y", "File_Path", "World_Name",
+    "File_Format", "Resolution_Percentage", "Scene", "have_seq", "w_comp",
+    "noise_t", "Ambient_Occlusion", "Subsurface_Reflection", "Simplify", "Bloom",
+    "Motion_Blur", "Objects", "Meshes", "Polygons", "View_Layers", "Scenes",
+    "All_Scenes",
+]
+# Keys that describe the file rather than one of its scenes
+FILE_KEYS = ["FilePath", "FileName", "blender_ver", "Scenes", "All_Scenes"]
+SCENE_KEYS = [key for key in RENDER_SETTINGS_KEYS if key not in FILE_KEYS]
+
+# ImageFormatData.imtype -> RNA identifier of image_settings.file_format
+IMAGE_TYPES = {
+    0: "TARGA", 1: "IRIS", 4: "JPEG", 14: "TARGA_RAW", 15: "AVI_RAW",
+    16: "AVI_JPEG", 17: "PNG", 20: "BMP", 21: "HDR", 22: "TIFF", 23: "OPEN_EXR",
+    24: "FFMPEG", 26: "CINEON", 27: "DPX", 28: "OPEN_EXR_MULTILAYER",
+    30: "JPEG2000", 35: "WEBP",
+}
+
+R_SIMPLIFY = 1 << 24
+SCE_EEVEE_GTAO_ENABLED = 1 << 4
+SCE_EEVEE_BLOOM_ENABLED = 1 << 8
+SCE_EEVEE_MOTION_BLUR_ENABLED = 1 << 9
+SCE_EEVEE_SSR_ENABLED = 1 << 14
+
+SEQ_TYPE_META = 1
+SEQ_TYPE_MOVIE = 3
+
+OB_MESH = 1
+
+IDP_INT = 1
+IDP_FLOAT = 2
+IDP_GROUP = 6
+IDP_DOUBLE = 8
+
+# Cycles settings only end up in the file once they differ from the add-on
+# defaults. These are the defaults of the Cycles add-on since Blender 3.0
+# (floats as bpy returns them, after a round trip through a C float).
+CYCLES_DEFAULTS = {
+    "samples": 4096,
+    "adaptive_threshold": struct.unpack("f", struct.pack("f", 0.01))[0],
+}
+
+
+def _id_properties(blend, id_view):
+    # Python defined properties (scene.cycles, ...) live in the ID's
+    # IDProperty group, Blender 5.0 moved them to system_properties
+    values = {}
+    for field in ("properties", "system_properties"):
+        group = blend.deref(id_view.get(field, 0))
+        if group is not None:
+            values.update(_idproperty_value(blend, group))
+    return values
+
+
+def _idproperty_value(blend, prop):
+    prop_type = prop.get("type")
+    data = prop.get("data")
+    if prop_type == IDP_GROUP:
+        return {
+            child.get("name"): _idproperty_value(blend, child)
+            for child in blend.iter_listbase(data.get("group"))
+        }
+    if prop_type == IDP_INT:
+        return data.get("val")
+    if prop_type == IDP_FLOAT:
+        return struct.unpack(blend.endian + "f", struct.pack(blend.endian + "i", data.get("val")))[0]
+    if prop_type == IDP_DOUBLE:
+        # Stored in val/val2 as one 8 byte value
+        raw = struct.pack(blend.endian + "ii", data.get("val"), data.get("val2"))
+        return struct.unpack(blend.endian + "d", raw)[0]
+    return MISSING
+
+
+def _has_movie_strip(blend, seqbase, depth=0):
+    for strip in blend.iter_listbase(seqbase):
+        strip_type = strip.get("type")
+        if strip_type == SEQ_TYPE_MOVIE:
+            return True
+        if strip_type == SEQ_TYPE_META and depth < 32:
+            if _has_movie_strip(blend, strip.get("seqbase"), depth + 1):
+                return True
+    return False
+
+
+def active_scene(blend):
+    # The scene bpy.context.scene points to after open_mainfile
+    scenes = blend.find_blocks("SC")
+    if not scenes:
+        raise BlendReadError(f"No scene in {blend.file_path}")
+    glob = blend.find_blocks("GLOB")
+    if glob:
+        current = blend.view(glob[0]).get("curscene", 0)
+        block = blend.block_at(current)
+        if block is not None and block.code == "SC":
+            return blend.view(block)
+    return blend.view(scenes[0])
+
+
+def _collection_objects(blend, collection, objects, depth=0):
+    if collection is None or depth > 64:
+        return
+    for item in blend.iter_listbase(collection.get("gobject")):
+        address = item.get("ob", 0)
+        if address:
+            objects[address] = True
+    for child in blend.iter_listbase(collection.get("children")):
+        _collection_objects(blend, blend.deref(child.get("collection", 0)), objects, depth + 1)
+
+
+def scene_objects(blend, scene):
+    # Addresses of the objects in the scene, like scene.objects. None when
+    # the file keeps them in a way this reader does not know.
+    objects = {}
+    if scene.has("master_collection"):
+        _collection_objects(blend, blend.deref(scene.get("master_collection")), objects)
+    elif scene.has("base"):
+        # Before 2.80
+        for base in blend.iter_listbase(scene.get("base")):
+            address = base.get("object", 0)
+            if address:
+                objects[address] = True
+    else:
+        return None
+    return list(objects)
+
+
+def scene_statistics(blend, scene):
+    # Object, mesh and polygon counts (of the meshes before modifiers, like
+    # mesh.polygons) and the view layer names. Left out when the file does
+    # not have what they are counted from, e.g. linked meshes.
+    statistics = {}
+    objects = scene_objects(blend, scene)
+    if objects is not None:
+        statistics["Objects"] = len(objects)
+        meshes, polygons = 0, 0
+        for address in objects:
+            obj = blend.deref(address)
+            if obj is None or obj.get("type") != OB_MESH:
+                continue
+            meshes += 1
+            mesh = blend.deref(obj.get("data", 0))
+            count = MISSING if mesh is None else mesh.get_first("faces_num", "totpoly")
+            if polygons is not None and count is not MISSING:
+                polygons += count
+            else:
+                polygons = None
+        statistics["Meshes"] = meshes
+        if polygons is not None:
+            statistics["Polygons"] = polygons
+    if scene.has("view_layers"):
+        statistics["View_Layers"] = ", ".join(
+            layer.get("name", "") for layer in blend.iter_listbase(scene.get("view_layers"))
+        )
+    return statistics
+
+
+def file_version(blend):
+    # bpy.data.version: (major, minor, subversion)
+    subversion = 0
+    glob = blend.find_blocks("GLOB")
+    if glob:
+        subversion = blend.view(glob[0]).get("subversion", 0)
+    return (blend.version[0], blend.version[1], subversion)
+
+
+def scene_render_settings(blend, scene):
+    # Same fields as blender_loader.render_Settings. Fields that cannot be
+    # decoded from this file are left out, see read_render_settings().
+    settings = {}
+    render = scene.get("r")
+    version = file_version(blend)
+    scene_name = scene.get("id").get("name", "")[2:]
+
+    engine = render.get("engine")
+    if engine is not MISSING:
+        settings["Render_Engine"] = engine
+    # A list, like bpy's version after the JSON round trip of the loader and
+    # the cache
+    settings["blender_ver"] = list(version)
+
+    start, end = render.get("sfra"), render.get("efra")
+    if start is not MISSING and end is not MISSING:
+        settings["Total_Frames"] = f"{end - start} ({start}-{end})"
+
+    cycles = _id_properties(blend, scene.get("id")).get("cycles", {})
+    if not isinstance(cycles, dict):
+        cycles = {}
+    if version >= (3, 0, 0):
+        cycles = dict(CYCLES_DEFAULTS, **cycles)
+    if "samples" in cycles and cycles["samples"] is not MISSING:
+        settings["Render_Samples"] = cycles["samples"]
+
+    for key, field in (
+        ("Resolution_X", "xsch"),
+        ("Resolution_Y", "ysch"),
+        ("File_Path", "pic"),
+    ):
+        value = render.get(field)
+        if value is not MISSING:
+            settings[key] = value
+
+    world = scene.get("world", 0)
+    if not world:
+        settings["World_Name"] = "-"
+    else:
+        name = blend.id_name(world)
+        if name is not None:
+            settings["World_Name"] = name
+
+    image_format = render.get("im_format")
+    if image_format is not MISSING:
+        file_format = IMAGE_TYPES.get(image_format.get("imtype"))
+        if file_format is not None:
+            settings["File_Format"] = file_format
+
+    size = render.get("size")
+    if size is not MISSING:
+        settings["Resolution_Percentage"] = size
+    settings["Scene"] = scene_name
+
+    editing = blend.deref(scene.get("ed", 0))
+    settings["have_seq"] = editing is not None and _has_movie_strip(blend, editing.get("seqbase"))
+
+    use_nodes = scene.get("use_nodes")
+    if use_nodes is not MISSING:
+        settings["w_comp"] = bool(use_nodes)
+
+    threshold = cycles.get("adaptive_threshold", MISSING)
+    if threshold is not MISSING:
+        settings["noise_t"] = threshold if threshold else "-"
+
+    mode = render.get("mode")
+    settings.update({
+        "Ambient_Occlusion": "-",
+        "Subsurface_Reflection": "-",
+        "Bloom": "-",
+        "Motion_Blur": "-",
+    })
+    if mode is not MISSING:
+        settings["Simplify"] = bool(mode & R_SIMPLIFY)
+
+    if engine in EEVEE_ENGINES:
+        for key in ("Ambient_Occlusion", "Subsurface_Reflection", "Bloom", "Motion_Blur", "Render_Samples"):
+            settings.pop(key, None)
+        eevee = scene.get("eevee")
+        # EEVEE Next (4.2+) dropped these flags, leave them to bpy
+        if eevee is not MISSING and version < (4, 2, 0):
+            flag = eevee.get("flag")
+            settings.update({
+                "Ambient_Occlusion": bool(flag & SCE_EEVEE_GTAO_ENABLED),
+                "Subsurface_Reflection": bool(flag & SCE_EEVEE_SSR_ENABLED),
+                "Bloom": bool(flag & SCE_EEVEE_BLOOM_ENABLED),
+                "Motion_Blur": bool(flag & SCE_EEVEE_MOTION_BLUR_ENABLED),
+            })
+            samples = eevee.get("taa_render_samples")
+            if samples is not MISSING:
+                settings["Render_Samples"] = samples
+    return settings
+
+
+def read_render_settings(file_path):
+    # render_Settings without bpy: the active scene at the top level, every
+    # scene in "All_Scenes" (sorted by name, like bpy.data.scenes). Returns
+    # the decoded fields in RENDER_SETTINGS_KEYS order; keys this reader
+    # cannot decode for the file are missing, the caller asks bpy for those.
+    file_path = os.path.abspath(file_path)
+    with BlendFile(file_path) as blend:
+        try:
+            active = active_scene(blend)
+            scenes = []
+            for block in blend.find_blocks("SC"):
+                scene = blend.view(block)
+                settings = scene_render_settings(blend, scene)
+                settings.update(scene_statistics(blend, scene))
+                if scene.offset == active.offset:
+                    decoded = settings
+                scenes.append(settings)
+        except (struct.error, ValueError, IndexError, AttributeError, TypeError) as e:
+            raise BlendReadError(f"Could not decode {file_path}: {e}")
+    decoded = dict(decoded)
+    decoded["FilePath"] = file_path
+    decoded["FileName"] = os.path.basename(file_path)
+    decoded["Scenes"] = len(scenes)
+    if all(not missing_scene_settings(scene) for scene in scenes):
+        decoded["All_Scenes"] = [
+            {key: scene[key] for key in SCENE_KEYS}
+            for scene in sorted(scenes, key=lambda scene: scene["Scene"])
+        ]
+    return {key: decoded[key] for key in RENDER_SETTINGS_KEYS if key in decoded}
+
+
+def missing_render_settings(settings):
+    return [key for key in RENDER_SETTINGS_KEYS if key not in settings]
+
+
+def missing_scene_settings(settings):
+    return [key for key in SCENE_KEYS if key not in settings]
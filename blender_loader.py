@@ -1,29 +1,52 @@
 import sys
-import bpy
 import os
+import json
+from ipc import open_channel, RecordReader, EEVEE_ENGINES
+from tracing import span
+from blend_reader import SCENE_KEYS
+
+# Worker mode talks to the pool over stdout, claim it before bpy can print
+CHANNEL = open_channel() if __name__ == "__main__" and "--worker" in sys.argv else None
+
+with span("import_bpy"):
+    import bpy
 
 def render_Settings(C,D, scene):
-    render_settings = scene.render
+    # The active scene at the top level, every scene under "All_Scenes"
+    # (see blend_reader.RENDER_SETTINGS_KEYS), all from this one open file
     file_path = D.filepath
-    
     settings = {
         "FilePath": file_path,
         "FileName": os.path.basename(file_path),
+    }
+    settings.update(scene_settings(D, scene))
+    all_scenes = []
+    for other in sorted(D.scenes, key=lambda other: other.name):
+        values = settings if other == scene else scene_settings(D, other)
+        all_scenes.append({key: value for key, value in values.items() if key in SCENE_KEYS})
+    settings["Scenes"] = len(D.scenes)
+    settings["All_Scenes"] = all_scenes
+    return settings
+
+def scene_settings(D, scene):
+    render_settings = scene.render
+
+    settings = {
         "Render_Engine": scene.render.engine,
         "blender_ver": D.version,
         # "FPS": scene.render.fps,
-        "Total_Frames": f"{scene.frame_end - scene.frame_start} ({D.scenes[C.scene.name].frame_start}-{D.scenes[C.scene.name].frame_end})",
-        "Render_Samples": D.scenes[C.scene.name].cycles.samples,
+        "Total_Frames": f"{scene.frame_end - scene.frame_start} ({scene.frame_start}-{scene.frame_end})",
+        "Render_Samples": scene.cycles.samples,
         "Resolution_X": render_settings.resolution_x,
         "Resolution_Y": render_settings.resolution_y,
         "File_Path": render_settings.filepath,
         "World_Name": "-" if scene.world is None else scene.world.name,
         "File_Format": render_settings.image_settings.file_format,
         "Resolution_Percentage": render_settings.resolution_percentage,
-        "Scene": C.scene.name,
-        "have_seq": has_video_sequence(C, D),
-        "w_comp": D.scenes[C.scene.name].use_nodes,
-        "noise_t": D.scenes[C.scene.name].cycles.adaptive_threshold if D.scenes[C.scene.name].cycles.adaptive_threshold else "-",
+        "Scene": scene.name,
+        "have_seq": has_video_sequence(scene),
+        "w_comp": scene.use_nodes,
+        "noise_t": scene.cycles.adaptive_threshold if scene.cycles.adaptive_threshold else "-",
         "Ambient_Occlusion": "-",
         "Subsurface_Reflection": "-",
         "Simplify": scene.render.use_simplify,
@@ -33,24 +56,31 @@ def render_Settings(C,D, scene):
     }
 
     # Update values for EEVEE engine
-    if scene.render.engine in ['BLENDER_EEVEE', "EEVEE"]:
+    if scene.render.engine in EEVEE_ENGINES:
+        # Some of the flags are gone since EEVEE Next (4.2), those stay "-"
         settings.update({
-            "Ambient_Occlusion": D.scenes[C.scene.name].eevee.use_gtao,
-            "Subsurface_Reflection": D.scenes[C.scene.name].eevee.use_ssr,
+            "Ambient_Occlusion": getattr(scene.eevee, "use_gtao", "-"),
+            "Subsurface_Reflection": getattr(scene.eevee, "use_ssr", "-"),
             "Simplify": scene.render.use_simplify,
-            "Bloom": D.scenes[C.scene.name].eevee.use_bloom,
-            "Motion_Blur": D.scenes[C.scene.name].eevee.use_motion_blur,
-            "Render_Samples": D.scenes[C.scene.name].eevee.taa_render_samples,
+            "Bloom": getattr(scene.eevee, "use_bloom", "-"),
+            "Motion_Blur": getattr(scene.eevee, "use_motion_blur", "-"),
+            "Render_Samples": scene.eevee.taa_render_samples,
         })
+    settings.update(scene_statistics(scene))
     return settings
 
-def has_video_sequence(C, D):
-    # Get the Video Sequence Editor (VSE)
-    if not D.scenes:
-        return False
+def scene_statistics(scene):
+    # Polygons of the meshes before modifiers, nothing is evaluated
+    meshes = [obj for obj in scene.objects if obj.type == 'MESH']
+    return {
+        "Objects": len(scene.objects),
+        "Meshes": len(meshes),
+        "Polygons": sum(len(obj.data.polygons) for obj in meshes),
+        "View_Layers": ", ".join(layer.name for layer in scene.view_layers),
+    }
 
-    # Assuming the active scene has the VSE
-    scene = C.scene
+def has_video_sequence(scene):
+    # Get the Video Sequence Editor (VSE)
     if scene.sequence_editor is None:
         return False
 
@@ -62,24 +92,45 @@ def has_video_sequence(C, D):
     return False
 
 
-def load_blend_file(file_path):
+def extract_settings(file_path):
     bpy.context.preferences.view.use_save_prompt = False
-    bpy.ops.wm.open_mainfile(filepath=file_path)
-    
-    # Format the important information
-    settings_info = (
-        f"_Result"
-        f"{render_Settings(bpy.context, bpy.data, bpy.context.scene)}"
-        f"_Result"
-    )
-    return settings_info
+    with span("open_mainfile", file_path):
+        bpy.ops.wm.open_mainfile(filepath=file_path)
+    with span("render_settings", file_path):
+        return render_Settings(bpy.context, bpy.data, bpy.context.scene)
+
+
+def load_blend_file(file_path):
+    # One-shot mode (one Blender process per file, see benchmark.py): the
+    # settings as JSON, like the result records of the worker
+    return json.dumps(extract_settings(file_path))
+
+
+def run_worker(channel):
+    # Resident mode: bpy is imported once, then "load" requests are read from
+    # stdin and answered with progress/result/error records (see ipc.py).
+    # The worker exits when stdin is closed (see worker_pool.LoaderPool).
+    channel.write("hello", pid=os.getpid(), blender=bpy.app.version_string)
+    for request in RecordReader(sys.stdin.buffer):
+        file_path = request.get("path")
+        if request["type"] != "load" or not file_path:
+            channel.write("error", path=file_path, message=f"Unexpected request {request!r}")
+            continue
+        try:
+            channel.write("progress", path=file_path, phase="open_mainfile")
+            settings = extract_settings(file_path)
+            channel.write("result", path=file_path, settings=settings)
+        except Exception as e:
+            channel.write("error", path=file_path, message=str(e))
 
 
 if __name__ == "__main__":
+    if sys.argv[1] == "--worker":
+        run_worker(CHANNEL)
+        sys.exit(0)
     file_path = sys.argv[1]
     try:
-        info = load_blend_file(file_path)
-        print(info, "SUCCESS")
+        print(load_blend_file(file_path))
     except Exception as e:
         print(f"Failed to load Blender file:\n{str(e)}", file=sys.stderr)
         sys.exit(1)
@@ -1,7 +1,17 @@
-import bpy
 import sys
 import os
+import ast
 import logging
+import json
+from metadata_cache import MetadataCache
+from ipc import open_channel, normalize_settings, SCENE_EDITS_KEY, EEVEE_ENGINES
+from tracing import span
+
+# Batch mode reports over stdout, claim it before bpy can print
+CHANNEL = open_channel() if __name__ == "__main__" and "--manifest" in sys.argv else None
+
+with span("import_bpy"):
+    import bpy
 
 # Set up logging
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -14,7 +24,8 @@ def log_message(message):
     logging.debug(message)
 
 def remove_video_sequences(scene, settings):
-    if "have_seq" in settings and settings["have_seq"]:
+    # have_seq switched off in the explorer: drop the video strips
+    if "have_seq" in settings and not str_to_bool(settings["have_seq"]):
         sequence_editor = scene.sequence_editor
         if sequence_editor:
             for seq in sequence_editor.sequences_all:
@@ -31,45 +42,130 @@ def str_to_bool(s):
     except:
         return s
 
+# The scene.eevee flag of each EEVEE setting
+EEVEE_FLAGS = {
+    "Ambient_Occlusion": "use_gtao",
+    "Subsurface_Reflection": "use_ssr",
+    "Bloom": "use_bloom",
+    "Motion_Blur": "use_motion_blur",
+}
+
 def apply_render_settings(scene, D, settings):
+    # Only the settings present are applied: the explorer sends just the
+    # fields that were edited, so the rest of the file is left alone. "-"
+    # marks a field that does not apply to the scene and is never written.
     log_message(f"APPLY {settings}")
-    scene.render.engine = settings.get("Render_Engine", scene.render.engine)
+    settings = {key: value for key, value in settings.items() if value != "-"}
+    render = scene.render
+    if "Render_Engine" in settings:
+        render.engine = settings["Render_Engine"]
     # scene.render.fps = int(settings.get("FPS", scene.render.fps))
-    # scene.frame_start = 1
-    # scene.frame_end = int(settings.get("Total_Frames", scene.frame_end + scene.frame_start))+1
-    scene.render.resolution_x = int(settings.get("Resolution_X", scene.render.resolution_x))
-    scene.render.resolution_y = int(settings.get("Resolution_Y", scene.render.resolution_y))
-    scene.render.filepath = settings.get("File_Path", scene.render.filepath)
-    scene.render.resolution_percentage = int(settings.get("Resolution_Percentage", scene.render.resolution_percentage))
-    scene.render.use_simplify = str_to_bool(settings.get("Simplify", scene.render.use_simplify))
-    D.scenes[bpy.context.scene.name].render.image_settings.file_format = settings.get("File_Format")
-
-    if scene.world:
-        scene.world.name = settings.get("World_Name", scene.world.name)
-
-    if scene.render.engine in ['BLENDER_EEVEE', 'EEVEE']:
-        scene.eevee.use_gtao = str_to_bool(settings.get("Ambient_Occlusion", scene.eevee.use_gtao))
-        scene.eevee.use_ssr = str_to_bool(settings.get("Subsurface_Reflection", scene.eevee.use_ssr))
-        scene.eevee.use_bloom = str_to_bool(settings.get("Bloom", scene.eevee.use_bloom))
-        scene.eevee.use_motion_blur = str_to_bool(settings.get("Motion_Blur", scene.eevee.use_motion_blur))
-        scene.eevee.taa_render_samples = int(settings.get("Render_Samples", scene.eevee.taa_render_samples))
-    elif scene.render.engine == 'CYCLES':
-        scene.cycles.samples = int(settings.get("Render_Samples", scene.cycles.samples))
-        scene.cycles.adaptive_threshold = float(settings.get("noise_t", scene.cycles.adaptive_threshold))
-
-    scene.use_nodes = str_to_bool(settings.get("w_comp", scene.use_nodes))
+    if "Resolution_X" in settings:
+        render.resolution_x = int(settings["Resolution_X"])
+    if "Resolution_Y" in settings:
+        render.resolution_y = int(settings["Resolution_Y"])
+    if "File_Path" in settings:
+        render.filepath = settings["File_Path"]
+    if "Resolution_Percentage" in settings:
+        render.resolution_percentage = int(settings["Resolution_Percentage"])
+    if "Simplify" in settings:
+        render.use_simplify = str_to_bool(settings["Simplify"])
+    if "File_Format" in settings:
+        render.image_settings.file_format = settings["File_Format"]
+
+    if scene.world and "World_Name" in settings:
+        scene.world.name = settings["World_Name"]
+
+    if render.engine in EEVEE_ENGINES:
+        for key, attribute in EEVEE_FLAGS.items():
+            # Some of these are gone since EEVEE Next (4.2)
+            if key in settings and hasattr(scene.eevee, attribute):
+                setattr(scene.eevee, attribute, str_to_bool(settings[key]))
+        if "Render_Samples" in settings:
+            scene.eevee.taa_render_samples = int(settings["Render_Samples"])
+    elif render.engine == 'CYCLES':
+        if "Render_Samples" in settings:
+            scene.cycles.samples = int(settings["Render_Samples"])
+        if "noise_t" in settings:
+            scene.cycles.adaptive_threshold = float(settings["noise_t"])
+
+    if "w_comp" in settings:
+        scene.use_nodes = str_to_bool(settings["w_comp"])
 
     remove_video_sequences(scene, settings)
 
-    log_message(f"Settings applied to scene '{scene.name}'")
+    log_message(f"Settings applied to scene '{scene.name}': {', '.join(settings) or 'nothing'}")
+
+def apply_scene_settings(scene, D, settings):
+    # The top level settings go to `scene` (the active one), the edits in
+    # Scene_Edits to the scenes they name, all in this one session
+    settings = dict(settings)
+    scene_edits = settings.pop(SCENE_EDITS_KEY, {})
+    apply_render_settings(scene, D, settings)
+    for name, edits in scene_edits.items():
+        other = D.scenes.get(name)
+        if other is None:
+            raise ValueError(f"No scene named {name!r} in {D.filepath}")
+        apply_render_settings(other, D, edits)
+
+def parse_settings(text):
+    # Settings passed on the command line: JSON, or the str(dict) older
+    # explorers sent. Never eval'd.
+    try:
+        settings = json.loads(text)
+    except ValueError:
+        settings = ast.literal_eval(text)
+    return normalize_settings(settings)
 
 def save_blend_file(output_path, settings):
-    main_file_path = eval(settings).get("FilePath")
-    bpy.ops.wm.open_mainfile(filepath=main_file_path)
-    apply_render_settings(bpy.context.scene, bpy.data, eval(settings))
-    bpy.ops.wm.save_as_mainfile(filepath=output_path)
+    settings = parse_settings(settings)
+    save_settings_to(settings.get("FilePath"), output_path, settings)
+
+def save_settings_to(source_path, output_path, settings):
+    with span("open_mainfile", source_path):
+        bpy.ops.wm.open_mainfile(filepath=source_path)
+    with span("apply_settings", source_path):
+        apply_scene_settings(bpy.context.scene, bpy.data, settings)
+    with span("save_mainfile", output_path):
+        bpy.ops.wm.save_as_mainfile(filepath=output_path)
+    invalidate_cached_settings(output_path)
+
+def invalidate_cached_settings(file_path):
+    # The explorer must not show the settings from before this save
+    try:
+        cache = MetadataCache()
+        try:
+            cache.invalidate(file_path)
+        finally:
+            cache.close()
+    except Exception as e:
+        log_message(f"Could not invalidate cached settings of {file_path}: {e}")
+
+def run_manifest(manifest_path, channel):
+    # Batch mode: one Blender session saves every entry of the manifest, a
+    # JSON list of {"source": ..., "output": ..., "settings": {...}}. A
+    # result or error record (see ipc.py) is sent per entry as soon as it
+    # is done, then a done record.
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    channel.write("hello", pid=os.getpid(), blender=bpy.app.version_string)
+    failed = 0
+    for index, entry in enumerate(entries):
+        source, output = entry.get("source"), entry.get("output")
+        try:
+            channel.write("progress", path=source, phase="save", index=index, total=len(entries))
+            save_settings_to(source, output, normalize_settings(entry["settings"]))
+            channel.write("result", path=source, source=source, output=output)
+        except Exception as e:
+            failed += 1
+            log_message(f"Failed to save {output}: {e}")
+            channel.write("error", path=source, source=source, output=output, message=str(e))
+    channel.write("done", saved=len(entries) - failed, failed=failed)
+    return failed
 
 if __name__ == "__main__":
+    if sys.argv[1] == "--manifest":
+        sys.exit(1 if run_manifest(sys.argv[2], CHANNEL) else 0)
     settings = sys.argv[2]  # Get the output file path from command line arguments
     file_path = sys.argv[1]
     output_path = file_path
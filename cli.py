@@ -0,0 +1,484 @@
+import os
+import sys
+import csv
+import json
+import fnmatch
+import argparse
+import threading
+import tracing
+from worker_pool import LoaderPool, load_render_settings
+from metadata_cache import MetadataCache
+from batch_save import save_entry, run_save_batch
+from dependency_index import DependencyIndex
+from ipc import ProtocolError, normalize_settings, ALL_SCENES_KEY, SCENE_EDITS_KEY
+from blend_reader import RENDER_SETTINGS_KEYS, FILE_KEYS
+from directory_scan import (
+    scan_files, default_concurrency, iter_blend_files, split_patterns, DEFAULT_INCLUDE
+)
+
+# Headless front end for farm nodes and scripts. Never imports Qt, so it
+# starts fast and runs without a display:
+#
+#   python cli.py scan /projects/show --format csv -o settings.csv
+#   python cli.py apply rules.json /projects/show --workers 4 --checkpoint apply.done
+#   python cli.py deps /projects/show -o missing.jsonl
+#   python cli.py users "/projects/show/textures/wood_*.png"
+#
+# A rules file is a JSON list of rules, applied in order to every file whose
+# settings match all of "match" (glob patterns for text, a list for "any of"):
+#
+#   [{"match": {"Render_Engine": "CYCLES"}, "max": {"Render_Samples": 256}},
+#    {"match": {"FilePath": "*/previs/*"}, "set": {"Resolution_Percentage": 50}}]
+#
+# Rules change the active scene of a file. A rule with "scenes" (a glob or a
+# list of scene names) is matched against and applied to every scene with
+# such a name instead, all scenes of a file are saved in one session:
+#
+#   [{"scenes": "*", "match": {"Render_Engine": "CYCLES"}, "set": {"Simplify": true}}]
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+
+RULE_ACTIONS = ("set", "min", "max")
+
+
+class Checkpoint:
+    # Paths that are done, one per line. Appended and flushed after every
+    # file, so an interrupted run picks up where it stopped with --resume.
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        self._file = None
+        if path is None:
+            return
+        if resume and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.done = {line.rstrip("\n") for line in f if line.strip()}
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def __contains__(self, file_path):
+        return file_path in self.done
+
+    def mark(self, file_path):
+        with self._lock:
+            self.done.add(file_path)
+            if self._file is not None:
+                self._file.write(file_path + "\n")
+                self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class JsonLinesWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, record):
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+
+
+class CsvWriter:
+    # One column per render_Settings key plus the error, if any. Only the
+    # active scene, the settings of every scene are in the jsonl output.
+
+    def __init__(self, stream, write_header=True):
+        self.stream = stream
+        fieldnames = [key for key in RENDER_SETTINGS_KEYS if key != ALL_SCENES_KEY]
+        self.writer = csv.DictWriter(
+            stream, fieldnames=fieldnames + ["error"], extrasaction="ignore"
+        )
+        if write_header:
+            self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow(record)
+        self.stream.flush()
+
+
+def open_output(path, output_format, append=False):
+    if path in (None, "-"):
+        stream, existing = sys.stdout, False
+    else:
+        existing = append and os.path.exists(path) and os.path.getsize(path) > 0
+        stream = open(path, "a" if append else "w", encoding="utf-8", newline="")
+    if output_format == "csv":
+        return stream, CsvWriter(stream, write_header=not existing)
+    return stream, JsonLinesWriter(stream)
+
+
+def load_rules(rules_path):
+    # Validates the rules up front, values are coerced like edits in the
+    # explorer (see ipc.normalize_settings)
+    with open(rules_path, "r", encoding="utf-8") as f:
+        rules = json.load(f)
+    if isinstance(rules, dict):
+        rules = [rules]
+    if not isinstance(rules, list):
+        raise ProtocolError("A rules file must hold a list of rules")
+    for index, rule in enumerate(rules):
+        if not isinstance(rule, dict) or not any(action in rule for action in RULE_ACTIONS):
+            raise ProtocolError(f"Rule {index} has none of {', '.join(RULE_ACTIONS)}")
+        if not isinstance(rule.get("match", {}), dict):
+            raise ProtocolError(f"Rule {index}: match must be a dict")
+        if not isinstance(rule.get("scenes", ""), (str, list)):
+            raise ProtocolError(f"Rule {index}: scenes must be a scene name pattern or a list of them")
+        for action in RULE_ACTIONS:
+            if action in rule:
+                rule[action] = normalize_settings(rule[action])
+    return rules
+
+
+def _matches_value(value, expected):
+    if isinstance(expected, list):
+        return any(_matches_value(value, item) for item in expected)
+    if isinstance(expected, str) and not isinstance(value, bool):
+        return fnmatch.fnmatchcase(str(value), expected)
+    return value == expected
+
+
+def rule_matches(rule, settings):
+    return all(
+        key in settings and _matches_value(settings[key], expected)
+        for key, expected in rule.get("match", {}).items()
+    )
+
+
+def _apply_rule(rule, settings):
+    if not rule_matches(rule, settings):
+        return
+    for key, value in rule.get("set", {}).items():
+        settings[key] = value
+    for key, limit in rule.get("max", {}).items():
+        current = settings.get(key)
+        if isinstance(current, (int, float)) and not isinstance(current, bool) and current > limit:
+            settings[key] = limit
+    for key, limit in rule.get("min", {}).items():
+        current = settings.get(key)
+        if isinstance(current, (int, float)) and not isinstance(current, bool) and current < limit:
+            settings[key] = limit
+
+
+def _changes(old_settings, new_settings):
+    return {
+        key: [old_settings.get(key), value]
+        for key, value in new_settings.items()
+        if old_settings.get(key) != value
+    }
+
+
+def apply_rules(settings, rules):
+    # Returns the new settings and {key: [old, new]} of what the rules
+    # changed. Changes of rules with "scenes" are listed per scene under
+    # Scene_Edits: {scene name: {key: [old, new]}}.
+    new_settings = dict(settings)
+    file_values = {key: settings[key] for key in FILE_KEYS if key in settings}
+    scenes = {scene.get("Scene"): dict(scene, **file_values) for scene in settings.get(ALL_SCENES_KEY) or []}
+    new_scenes = {name: dict(scene) for name, scene in scenes.items()}
+    for rule in rules:
+        if "scenes" not in rule:
+            _apply_rule(rule, new_settings)
+            continue
+        for name, scene in new_scenes.items():
+            if _matches_value(name, rule["scenes"]):
+                _apply_rule(rule, scene)
+    changes = _changes(settings, new_settings)
+    scene_changes = {}
+    for name, scene in new_scenes.items():
+        changed = _changes(scenes[name], scene)
+        if changed:
+            scene_changes[name] = changed
+    if scene_changes:
+        changes[SCENE_EDITS_KEY] = scene_changes
+    return new_settings, changes
+
+
+def edits_from_changes(changes):
+    # The settings a save has to write for the changes of apply_rules()
+    edits = {}
+    for key, change in changes.items():
+        if key == SCENE_EDITS_KEY:
+            edits[key] = {name: edits_from_changes(changed) for name, changed in change.items()}
+        else:
+            edits[key] = change[1]
+    return edits
+
+
+def scan_options(args):
+    return {
+        "include": split_patterns(args.include) or DEFAULT_INCLUDE,
+        "exclude": split_patterns(args.exclude),
+        "max_depth": args.max_depth,
+    }
+
+
+def scan_tree(args, checkpoint):
+    # (file_path, settings, error) for every file not in the checkpoint,
+    # in completion order
+    loader_pool = LoaderPool(size=args.workers)
+    metadata_cache = None if args.no_cache else MetadataCache()
+    file_paths = (
+        path for path in iter_blend_files(os.path.abspath(args.directory), **scan_options(args))
+        if path not in checkpoint
+    )
+
+    def load(file_path):
+        with tracing.span("load_file", file_path):
+            return load_render_settings(file_path, loader_pool, metadata_cache, args.timeout)
+
+    try:
+        yield from scan_files(file_paths, load, args.workers)
+    finally:
+        loader_pool.close()
+        if metadata_cache is not None:
+            metadata_cache.close()
+
+
+def run_scan(args):
+    checkpoint = Checkpoint(args.checkpoint, args.resume)
+    stream, writer = open_output(args.output, args.format, append=args.resume)
+    count = failed = 0
+    try:
+        for file_path, settings, error in scan_tree(args, checkpoint):
+            count += 1
+            if error is not None:
+                failed += 1
+                record = {"FilePath": file_path, "FileName": os.path.basename(file_path), "error": str(error)}
+            else:
+                record = settings
+            writer.write(record)
+            # Failed files are tried again with --resume
+            if error is None:
+                checkpoint.mark(file_path)
+            if not args.quiet:
+                print(f"[{count}] {file_path}{' FAILED' if error else ''}", file=sys.stderr)
+    finally:
+        checkpoint.close()
+        if stream is not sys.stdout:
+            stream.close()
+    print(f"Scanned {count} files, {failed} failed", file=sys.stderr)
+    return EXIT_FAILURES if failed else EXIT_OK
+
+
+def output_path_for(file_path, directory, output_dir):
+    if output_dir is None:
+        return file_path
+    relative = os.path.relpath(file_path, os.path.abspath(directory))
+    return os.path.join(os.path.abspath(output_dir), relative)
+
+
+def run_apply(args):
+    try:
+        rules = load_rules(args.rules)
+    except (OSError, ValueError, ProtocolError) as e:
+        print(f"Could not read rules from {args.rules}: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    checkpoint = Checkpoint(args.checkpoint, args.resume)
+    stream, writer = open_output(args.output, "jsonl", append=args.resume)
+    entries, changes_by_source = [], {}
+    failed = 0
+    lock = threading.Lock()
+    try:
+        for file_path, settings, error in scan_tree(args, checkpoint):
+            if error is not None:
+                failed += 1
+                writer.write({"FilePath": file_path, "ok": False, "error": str(error)})
+                continue
+            new_settings, changes = apply_rules(settings, rules)
+            if not changes:
+                checkpoint.mark(file_path)
+                continue
+            output = output_path_for(file_path, args.directory, args.output_dir)
+            if args.dry_run:
+                changes_by_source[file_path] = changes
+                writer.write({"FilePath": file_path, "output": output, "changes": changes, "dry_run": True})
+                continue
+            try:
+                # Only what the rules changed is written
+                entries.append(save_entry(file_path, output, edits_from_changes(changes)))
+            except ProtocolError as e:
+                failed += 1
+                writer.write({"FilePath": file_path, "ok": False, "error": str(e)})
+                continue
+            changes_by_source[file_path] = changes
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+
+        def on_result(record):
+            nonlocal failed
+            with lock:
+                result = {
+                    "FilePath": record["source"],
+                    "output": record["output"],
+                    "changes": changes_by_source.get(record["source"]),
+                    "ok": record["ok"],
+                }
+                if record["ok"]:
+                    checkpoint.mark(record["source"])
+                else:
+                    failed += 1
+                    result["error"] = record.get("error")
+                writer.write(result)
+
+        if entries:
+            print(f"Saving {len(entries)} changed files", file=sys.stderr)
+        run_save_batch(entries, args.workers, on_result, args.timeout)
+    finally:
+        checkpoint.close()
+        if stream is not sys.stdout:
+            stream.close()
+    print(f"Changed {len(changes_by_source)} files, {failed} failed", file=sys.stderr)
+    return EXIT_FAILURES if failed else EXIT_OK
+
+
+def run_deps(args):
+    # Updates the dependency index and writes one record per file with
+    # missing dependencies (every file with --all)
+    index = DependencyIndex(args.index)
+    stream, writer = open_output(args.output, "jsonl")
+    try:
+        def on_file(file_path, dependencies, error):
+            if not args.quiet:
+                print(f"{file_path}{' FAILED' if error else ''}", file=sys.stderr)
+
+        # The report covers the files of this walk, the index may hold
+        # more from runs with other filters
+        walked = set()
+        counts = index.update(
+            args.directory, args.workers, on_file, walked.add,
+            include=split_patterns(args.include) or DEFAULT_INCLUDE,
+            exclude=split_patterns(args.exclude), max_depth=args.max_depth,
+        )
+        print(
+            f"Indexed {counts['read']} files, {counts['unchanged']} unchanged, "
+            f"{counts['failed']} failed, {counts['removed']} removed",
+            file=sys.stderr,
+        )
+        missing = {}
+        for blend_path, kind, path, resolved in index.missing(args.directory):
+            if blend_path in walked:
+                missing.setdefault(blend_path, []).append({"kind": kind, "path": path, "resolved": resolved})
+        errors = [(blend_path, error) for blend_path, error in index.errors(args.directory) if blend_path in walked]
+        for blend_path, error in errors:
+            writer.write({"FilePath": blend_path, "error": error})
+        if args.all:
+            for blend_path in sorted(walked):
+                writer.write({
+                    "FilePath": blend_path,
+                    "dependencies": [
+                        {"kind": kind, "path": path, "resolved": resolved}
+                        for kind, path, resolved in index.dependencies_of(blend_path)
+                    ],
+                    "missing": missing.get(blend_path, []),
+                })
+        else:
+            for blend_path, dependencies in sorted(missing.items()):
+                writer.write({"FilePath": blend_path, "missing": dependencies})
+    finally:
+        index.close()
+        if stream is not sys.stdout:
+            stream.close()
+    print(f"{len(missing)} files with missing dependencies, {len(errors)} could not be read", file=sys.stderr)
+    # A file that could not be read may miss anything
+    return EXIT_FAILURES if missing or errors else EXIT_OK
+
+
+def run_users(args):
+    # Reverse lookup in the dependency index: which files use these paths
+    index = DependencyIndex(args.index)
+    stream, writer = open_output(args.output, "jsonl")
+    count = 0
+    try:
+        for pattern in args.paths:
+            for blend_path, kind, path, resolved in index.users_of(pattern):
+                count += 1
+                writer.write({"FilePath": blend_path, "kind": kind, "path": path, "resolved": resolved})
+    finally:
+        index.close()
+        if stream is not sys.stdout:
+            stream.close()
+    print(f"{count} uses found", file=sys.stderr)
+    return EXIT_OK
+
+
+def add_common_arguments(parser):
+    parser.add_argument("directory", help="directory tree to scan")
+    parser.add_argument("--workers", type=int, default=default_concurrency(),
+                        help="files loaded (and Blender sessions saving) at once")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="seconds Blender may spend on one file before it is killed")
+    parser.add_argument("--include", default=", ".join(DEFAULT_INCLUDE),
+                        help="comma separated file patterns to load")
+    parser.add_argument("--exclude", default="", help="comma separated file or directory patterns to skip")
+    parser.add_argument("--max-depth", type=int, default=None, help="how many directory levels to descend")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the metadata cache")
+    parser.add_argument("--checkpoint", default=None, help="file listing the paths that are done")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip the paths in --checkpoint and append to --output")
+    parser.add_argument("-o", "--output", default=None, help="output file (default: stdout)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no per-file progress on stderr")
+    parser.add_argument("--trace", default=None,
+                        help="record per-phase timings to this file (see tracing.py)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Scan and batch edit render settings of .blend files")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan = commands.add_parser("scan", help="write the render settings of every file as JSONL or CSV")
+    add_common_arguments(scan)
+    scan.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    scan.set_defaults(run=run_scan)
+
+    apply = commands.add_parser("apply", help="change render settings with a rules file")
+    apply.add_argument("rules", help="JSON rules file")
+    add_common_arguments(apply)
+    apply.add_argument("--output-dir", default=None,
+                       help="save changed files here (same relative paths) instead of in place")
+    apply.add_argument("--dry-run", action="store_true", help="report the changes without saving")
+    apply.set_defaults(run=run_apply)
+
+    deps = commands.add_parser(
+        "deps", help="index linked libraries and external files, report the missing ones"
+    )
+    deps.add_argument("directory", help="directory tree to scan")
+    deps.add_argument("--workers", type=int, default=default_concurrency(), help="files read at once")
+    deps.add_argument("--include", default=", ".join(DEFAULT_INCLUDE),
+                      help="comma separated file patterns to read")
+    deps.add_argument("--exclude", default="", help="comma separated file or directory patterns to skip")
+    deps.add_argument("--max-depth", type=int, default=None, help="how many directory levels to descend")
+    deps.add_argument("--all", action="store_true", help="list the dependencies of every file")
+    deps.add_argument("--index", default=None, help="dependency index database (default: in the cache directory)")
+    deps.add_argument("-o", "--output", default=None, help="output file (default: stdout)")
+    deps.add_argument("-q", "--quiet", action="store_true", help="no per-file progress on stderr")
+    deps.add_argument("--trace", default=None,
+                      help="record per-phase timings to this file (see tracing.py)")
+    deps.set_defaults(run=run_deps, resume=False)
+
+    users = commands.add_parser("users", help="list the indexed files that use these paths (see deps)")
+    users.add_argument("paths", nargs="+", help="file paths or glob patterns")
+    users.add_argument("--index", default=None, help="dependency index database (default: in the cache directory)")
+    users.add_argument("-o", "--output", default=None, help="output file (default: stdout)")
+    users.add_argument("--trace", default=None,
+                       help="record per-phase timings to this file (see tracing.py)")
+    users.set_defaults(run=run_users, resume=False)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.resume and not args.checkpoint:
+        print("--resume needs --checkpoint", file=sys.stderr)
+        return EXIT_USAGE
+    if args.trace:
+        tracing.enable(args.trace)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+import os
+import glob
+import sqlite3
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from blend_reader import BlendFile, BlendReadError, SEQ_TYPE_META, SEQ_TYPE_MOVIE
+from metadata_cache import cache_dir
+from directory_scan import scan_files, iter_blend_files, default_concurrency
+from tracing import span
+
+# Index of the external files .blend files use: linked libraries, images,
+# image sequences and UDIM tiles, movies, sounds, fonts, Alembic/USD caches,
+# volumes and sequencer strips. The paths are read from the ID blocks with
+# blend_reader, no bpy and no scene load, and kept in SQLite per file
+# (checked against size + mtime like the MetadataCache), so an audit only
+# reads the files that changed since the last one:
+#
+#   index = DependencyIndex()
+#   index.update("/projects/show")
+#   index.missing("/projects/show")       # [(blend, kind, path, resolved), ...]
+#   index.users_of("/textures/wood_*.png")
+#
+# Packed files are not dependencies and are left out. "//" paths are
+# resolved against the directory of the .blend file.
+
+Dependency = namedtuple("Dependency", ["kind", "path"])
+
+# Image.source / MovieClip.source
+IMA_SRC_FILE = 1
+IMA_SRC_SEQUENCE = 2
+IMA_SRC_MOVIE = 3
+IMA_SRC_TILED = 6
+MCLIP_SRC_SEQUENCE = 1
+
+SEQ_TYPE_IMAGE = 0
+
+# Placeholders for the tile number in the path of a tiled image
+UDIM_TOKENS = ("<UDIM>", "<UVTILE>")
+
+# Files per transaction while updating
+COMMIT_EVERY = 100
+
+
+def _packed(id_block):
+    if id_block.has("packedfiles"):
+        return bool(id_block.get("packedfiles").get("first", 0))
+    return bool(id_block.get("packedfile", 0))
+
+
+def _file_path(id_block):
+    # Renamed from name to filepath in 2.91, the old filepath was absolute
+    if id_block.has("name") and id_block.has("filepath"):
+        return id_block.get("name")
+    return id_block.get_first("filepath", "name", default="")
+
+
+def _strip_dependencies(blend, seqbase, depth=0):
+    for strip in blend.iter_listbase(seqbase):
+        strip_type = strip.get("type")
+        if strip_type == SEQ_TYPE_META and depth < 32:
+            yield from _strip_dependencies(blend, strip.get("seqbase"), depth + 1)
+        elif strip_type in (SEQ_TYPE_IMAGE, SEQ_TYPE_MOVIE):
+            # Renamed to Strip.data / StripData in 5.0
+            data = blend.deref(strip.get_first("data", "strip", default=0))
+            if data is None:
+                continue
+            directory = data.get_first("dirpath", "dir", default="")
+            element = blend.deref(data.get("stripdata", 0))
+            name = "" if element is None else element.get("name", "")
+            if not name:
+                continue
+            if directory and not directory.endswith(("/", "\\")):
+                directory += "/"
+            kind = "strip_movie" if strip_type == SEQ_TYPE_MOVIE else "strip_images"
+            yield Dependency(kind, directory + name)
+
+
+def _id_dependencies(blend):
+    for library in blend.find_blocks("LI"):
+        library = blend.view(library)
+        if not _packed(library):
+            yield Dependency("library", _file_path(library))
+
+    for image in blend.find_blocks("IM"):
+        image = blend.view(image)
+        source = image.get("source")
+        if _packed(image):
+            continue
+        if source == IMA_SRC_FILE:
+            yield Dependency("image", _file_path(image))
+        elif source == IMA_SRC_SEQUENCE:
+            yield Dependency("image_sequence", _file_path(image))
+        elif source == IMA_SRC_MOVIE:
+            yield Dependency("movie", _file_path(image))
+        elif source == IMA_SRC_TILED:
+            yield Dependency("udim", _file_path(image))
+
+    for clip in blend.find_blocks("MC"):
+        clip = blend.view(clip)
+        kind = "image_sequence" if clip.get("source") == MCLIP_SRC_SEQUENCE else "movie"
+        yield Dependency(kind, _file_path(clip))
+
+    for code, kind in (("SO", "sound"), ("VF", "font"), ("VO", "volume")):
+        for block in blend.find_blocks(code):
+            block = blend.view(block)
+            if not _packed(block):
+                yield Dependency(kind, _file_path(block))
+
+    for cache in blend.find_blocks("CF"):
+        yield Dependency("cache", _file_path(blend.view(cache)))
+
+    for scene in blend.find_blocks("SC"):
+        editing = blend.deref(blend.view(scene).get("ed", 0))
+        if editing is not None:
+            yield from _strip_dependencies(blend, editing.get("seqbase"))
+
+
+def read_dependencies(file_path):
+    # External files of a .blend file, paths as stored in it (often "//"
+    # relative). Raises BlendReadError when the file cannot be decoded.
+    with span("read_dependencies", file_path):
+        with BlendFile(file_path) as blend:
+            try:
+                dependencies = list(dict.fromkeys(
+                    dependency for dependency in _id_dependencies(blend)
+                    # Fonts built into Blender have no file
+                    if dependency.path and dependency.path != "<builtin>"
+                ))
+            except (ValueError, IndexError, AttributeError, TypeError) as e:
+                raise BlendReadError(f"Could not decode {file_path}: {e}")
+    return dependencies
+
+
+def resolve_path(path, blend_path):
+    # Absolute path of a dependency of `blend_path`
+    if path.startswith("//"):
+        relative = path[2:].replace("\\", "/")
+        path = os.path.join(os.path.dirname(os.path.abspath(blend_path)), relative)
+    return os.path.normpath(path)
+
+
+def path_exists(resolved_path):
+    # A tiled image exists when at least one of its tiles does
+    for token in UDIM_TOKENS:
+        if token in resolved_path:
+            head, tail = resolved_path.split(token, 1)
+            return bool(glob.glob(glob.escape(head) + "*" + glob.escape(tail)))
+    return os.path.exists(resolved_path)
+
+
+def check_paths(resolved_paths, workers=None):
+    # {path: exists} for many paths at once, each path is only looked at
+    # once and the lookups overlap (network shares answer slowly)
+    paths = list(dict.fromkeys(resolved_paths))
+    with ThreadPoolExecutor(max_workers=workers or default_concurrency() * 4) as executor:
+        return dict(zip(paths, executor.map(path_exists, paths)))
+
+
+def _prefix(dir_path):
+    # Matches every path when dir_path is None
+    return os.path.join(os.path.abspath(dir_path), "") if dir_path else ""
+
+
+class DependencyIndex:
+    # SQLite index keyed on the absolute .blend path. Safe to use from
+    # several threads.
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(cache_dir(), "dependencies.sqlite3")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS dependencies (
+                blend_path TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                path TEXT NOT NULL,
+                resolved TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS dependencies_blend ON dependencies (blend_path);
+            CREATE INDEX IF NOT EXISTS dependencies_resolved ON dependencies (resolved);"""
+        )
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _indexed(self, dir_path):
+        # {path: (size, mtime_ns)} of the files indexed below dir_path. Files
+        # that could not be read are None, so they are tried again (e.g.
+        # zstandard was installed since).
+        prefix = _prefix(dir_path)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path, size, mtime_ns, error FROM files WHERE substr(path, 1, ?) = ?",
+                (len(prefix), prefix),
+            ).fetchall()
+        return {path: None if error else (size, mtime_ns) for path, size, mtime_ns, error in rows}
+
+    def _store(self, file_path, stat, dependencies, error=None):
+        # Called with the lock held, committed by the caller
+        self._db.execute("DELETE FROM dependencies WHERE blend_path = ?", (file_path,))
+        self._db.executemany(
+            "INSERT INTO dependencies VALUES (?, ?, ?, ?)",
+            [
+                (file_path, dependency.kind, dependency.path, resolve_path(dependency.path, file_path))
+                for dependency in dependencies
+            ],
+        )
+        self._db.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+            (file_path, stat.st_size, stat.st_mtime_ns, error),
+        )
+
+    def update(self, dir_path, workers=None, on_file=None, visit_file=None, **scan_options):
+        # Reads the files below dir_path that are new or changed since the
+        # last update and forgets the ones that are gone. `scan_options` go
+        # to directory_scan.iter_blend_files; files they leave out keep their
+        # entries. on_file(path, dependencies, error) is called for every
+        # file read, visit_file(path) for every file walked (on the feeder
+        # thread). Returns a dict of counts.
+        indexed = self._indexed(dir_path)
+        seen = set()
+        counts = {"read": 0, "unchanged": 0, "failed": 0, "removed": 0}
+
+        def changed_files():
+            # Runs on the scan_files feeder thread
+            for file_path in iter_blend_files(os.path.abspath(dir_path), **scan_options):
+                seen.add(file_path)
+                if visit_file is not None:
+                    visit_file(file_path)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                if indexed.get(file_path) == (stat.st_size, stat.st_mtime_ns):
+                    counts["unchanged"] += 1
+                    continue
+                yield file_path
+
+        def load(file_path):
+            # Stat first, a save during the read shows up as a change next time
+            return os.stat(file_path), read_dependencies(file_path)
+
+        pending = 0
+        with span("update_dependencies", dir_path):
+            for file_path, result, error in scan_files(changed_files(), load, workers):
+                if error is not None:
+                    counts["failed"] += 1
+                    try:
+                        stat, dependencies = os.stat(file_path), []
+                    except OSError:
+                        continue
+                else:
+                    counts["read"] += 1
+                    stat, dependencies = result
+                with self._lock:
+                    self._store(file_path, stat, dependencies, None if error is None else str(error))
+                    pending += 1
+                    if pending >= COMMIT_EVERY:
+                        self._db.commit()
+                        pending = 0
+                if on_file is not None:
+                    on_file(file_path, dependencies, error)
+            gone = [(path,) for path in indexed if path not in seen and not os.path.exists(path)]
+            with self._lock:
+                self._db.executemany("DELETE FROM dependencies WHERE blend_path = ?", gone)
+                self._db.executemany("DELETE FROM files WHERE path = ?", gone)
+                self._db.commit()
+        counts["removed"] = len(gone)
+        return counts
+
+    def files(self, dir_path=None):
+        prefix = _prefix(dir_path)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+            ).fetchall()
+        return [path for (path,) in rows]
+
+    def dependencies_of(self, file_path):
+        # [(kind, path, resolved), ...] as last indexed
+        with self._lock:
+            return self._db.execute(
+                "SELECT kind, path, resolved FROM dependencies WHERE blend_path = ? ORDER BY rowid",
+                (os.path.abspath(file_path),),
+            ).fetchall()
+
+    def errors(self, dir_path=None):
+        # [(blend_path, error), ...] of the files that could not be read
+        prefix = _prefix(dir_path)
+        with self._lock:
+            return self._db.execute(
+                "SELECT path, error FROM files WHERE error IS NOT NULL AND substr(path, 1, ?) = ?",
+                (len(prefix), prefix),
+            ).fetchall()
+
+    def users_of(self, pattern):
+        # [(blend_path, kind, path, resolved), ...] of the files that use
+        # `pattern`: an absolute or relative path, or a glob like
+        # "/textures/wood_*.png" (matched case sensitively)
+        pattern = os.path.abspath(pattern)
+        with self._lock:
+            if glob.has_magic(pattern):
+                rows = self._db.execute(
+                    "SELECT blend_path, kind, path, resolved FROM dependencies WHERE resolved GLOB ?"
+                    " ORDER BY blend_path",
+                    (pattern,),
+                )
+            else:
+                rows = self._db.execute(
+                    "SELECT blend_path, kind, path, resolved FROM dependencies WHERE resolved = ?"
+                    " ORDER BY blend_path",
+                    (pattern,),
+                )
+            return rows.fetchall()
+
+    def missing(self, dir_path=None, workers=None):
+        # [(blend_path, kind, path, resolved), ...] of the dependencies of
+        # the files below dir_path (all files if None) that do not exist
+        prefix = _prefix(dir_path)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT blend_path, kind, path, resolved FROM dependencies"
+                " WHERE substr(blend_path, 1, ?) = ? ORDER BY blend_path, rowid",
+                (len(prefix), prefix),
+            ).fetchall()
+        with span("check_paths", dir_path, paths=len(rows)):
+            exists = check_paths((row[3] for row in rows), workers)
+        return [row for row in rows if not exists[row[3]]]
@@ -0,0 +1,165 @@
+import os
+import fnmatch
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_INCLUDE = ["*.blend"]
+_FEED_DONE = object()
+
+# Blender's numbered backups (.blend1, .blend2, ...) and save temp files
+BACKUP_PATTERNS = ["*.blend[0-9]*", "*.blend@"]
+
+
+def default_concurrency():
+    return os.cpu_count() or 1
+
+
+def split_patterns(text):
+    # "*.blend, shots/*" -> ["*.blend", "shots/*"]
+    return [pattern.strip() for pattern in text.split(",") if pattern.strip()]
+
+
+def _matches(name, rel_path, patterns):
+    # Patterns with a slash are matched against the path relative to the
+    # scanned root, all others against the file or directory name
+    for pattern in patterns:
+        if "/" in pattern:
+            if fnmatch.fnmatch(rel_path, pattern):
+                return True
+        elif fnmatch.fnmatch(name, pattern):
+            return True
+    return False
+
+
+def iter_blend_files(root, include=None, exclude=None, max_depth=None, visit_dir=None, subdir=None):
+    # Walk `root` with os.scandir and yield .blend paths as soon as they are
+    # found, so loading can start before the walk is done. `max_depth` 0
+    # only looks at `root` itself, None means no limit. Excluded directories
+    # are not entered. `visit_dir(path)` is called for every directory
+    # walked, e.g. to watch it. `subdir` only walks that part of the tree,
+    # patterns and depth still count from `root`.
+    include = include or DEFAULT_INCLUDE
+    exclude = list(exclude or []) + BACKUP_PATTERNS
+    root = os.path.abspath(root)
+    start = os.path.abspath(subdir) if subdir else root
+    start_depth = 0
+    if start != root:
+        start_depth = os.path.relpath(start, root).count(os.sep) + 1
+        if max_depth is not None and start_depth > max_depth:
+            return
+    stack = [(start, start_depth)]
+    while stack:
+        dir_path, depth = stack.pop()
+        if visit_dir is not None:
+            visit_dir(dir_path)
+        try:
+            entries = list(os.scandir(dir_path))
+        except OSError as e:
+            print(f"Could not scan {dir_path}: {str(e)}")
+            continue
+        entries.sort(key=lambda entry: entry.name)
+        subdirs = []
+        for entry in entries:
+            rel_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if (max_depth is None or depth < max_depth) and not _matches(entry.name, rel_path, exclude):
+                    subdirs.append(entry.path)
+                continue
+            if _matches(entry.name, rel_path, include) and not _matches(entry.name, rel_path, exclude):
+                yield entry.path
+        # Depth first, in name order
+        stack.extend((path, depth + 1) for path in reversed(subdirs))
+
+
+def file_signature(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def take_snapshot(file_paths):
+    snapshot = {}
+    for file_path in file_paths:
+        signature = file_signature(file_path)
+        if signature is not None:
+            snapshot[file_path] = signature
+    return snapshot
+
+
+def diff_snapshots(old, new):
+    # -> (added, modified, deleted) paths
+    added = [path for path in new if path not in old]
+    modified = [path for path in new if path in old and new[path] != old[path]]
+    deleted = [path for path in old if path not in new]
+    return added, modified, deleted
+
+
+def scan_files(file_paths, load, max_workers=None, cancel_event=None):
+    # Run `load(file_path)` for every path on a thread pool and yield
+    # (file_path, result, error) tuples in completion order. `file_paths`
+    # may be a generator (see iter_blend_files); it is consumed on a feeder
+    # thread, so results come back while the walk is still going. Setting
+    # `cancel_event` stops the scan: files that have not started yet are
+    # dropped, files that are already being loaded are allowed to finish.
+    # Qt free, so the GUI and headless tools can share it.
+    if cancel_event is None:
+        cancel_event = threading.Event()
+    max_workers = max_workers or default_concurrency()
+    stop = threading.Event()
+    results = queue.Queue()
+    # Keep every worker busy plus a few queued files
+    window = threading.Semaphore(max_workers * 2)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def stopped():
+        return stop.is_set() or cancel_event.is_set()
+
+    def run(file_path):
+        if stopped():
+            return None
+        return load(file_path)
+
+    def feed():
+        submitted = 0
+        try:
+            for path in file_paths:
+                while not window.acquire(timeout=0.1):
+                    if stopped():
+                        return
+                if stopped():
+                    return
+                future = executor.submit(run, path)
+                submitted += 1
+                future.add_done_callback(lambda future, path=path: results.put((path, future)))
+        finally:
+            results.put((_FEED_DONE, submitted))
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    total = None
+    finished = 0
+    try:
+        while total is None or finished < total:
+            file_path, future = results.get()
+            if file_path is _FEED_DONE:
+                total = future
+                continue
+            finished += 1
+            window.release()
+            if cancel_event.is_set():
+                break
+            try:
+                yield file_path, future.result(), None
+            except Exception as e:
+                yield file_path, None, e
+    finally:
+        stop.set()
+        feeder.join()
+        executor.shutdown(wait=True, cancel_futures=True)
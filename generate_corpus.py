@@ -0,0 +1,142 @@
+import bpy
+import os
+import sys
+import json
+import random
+import argparse
+from render_thumbnail import eevee_engine
+
+# Writes a reproducible set of .blend files for benchmark.py. File i gets
+# its engine, compression, VSE strips and movie strip from the bits of i (so
+# every mix shows up in any 16 files in a row) and its object count,
+# resolution and samples from a random generator seeded with --seed.
+
+# Bump when the files change, benchmark.py generates older corpora again
+CORPUS_VERSION = 2
+
+OBJECT_COUNTS = [1, 10, 100, 1000]
+RESOLUTIONS = [(1280, 720), (1920, 1080), (3840, 2160)]
+SAMPLES = [16, 64, 128, 4096]
+
+
+def file_params(index, rng):
+    return {
+        "name": f"bench_{index:04d}.blend",
+        "engine": "CYCLES" if index % 2 == 0 else "EEVEE",
+        "compressed": (index // 2) % 2 == 1,
+        "vse": (index // 4) % 2 == 1,
+        # A movie strip makes have_seq True
+        "movie": (index // 8) % 2 == 1,
+        "objects": rng.choice(OBJECT_COUNTS),
+        "resolution": list(rng.choice(RESOLUTIONS)),
+        "samples": rng.choice(SAMPLES),
+        "frames": rng.randint(1, 250),
+    }
+
+
+def add_objects(scene, count, rng):
+    verts = [(x, y, z) for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)]
+    faces = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+    base = bpy.data.meshes.new("Cube")
+    base.from_pydata(verts, [], faces)
+    base.update()
+    for index in range(count):
+        # A mesh of its own for every object, like a real scene
+        mesh = base if index == 0 else base.copy()
+        obj = bpy.data.objects.new(f"Cube.{index:04d}", mesh)
+        obj.location = (rng.uniform(-20, 20), rng.uniform(-20, 20), rng.uniform(0, 10))
+        obj.scale = (rng.uniform(0.2, 2),) * 3
+        scene.collection.objects.link(obj)
+
+    camera = bpy.data.objects.new("Camera", bpy.data.cameras.new("Camera"))
+    camera.location = (0, -60, 25)
+    camera.rotation_euler = (1.15, 0, 0)
+    scene.collection.objects.link(camera)
+    scene.camera = camera
+    light = bpy.data.objects.new("Sun", bpy.data.lights.new("Sun", type="SUN"))
+    scene.collection.objects.link(light)
+
+
+def write_movie(out_dir):
+    # A two frame clip for the movie strips, rendered from a color strip so
+    # no camera is needed. Returns the path Blender wrote it to.
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene = bpy.context.scene
+    render = scene.render
+    render.engine = "BLENDER_WORKBENCH"
+    render.resolution_x, render.resolution_y = 64, 64
+    render.image_settings.file_format = "FFMPEG"
+    render.ffmpeg.format = "MPEG4"
+    render.ffmpeg.codec = "H264"
+    render.filepath = os.path.join(os.path.abspath(out_dir), "clip_")
+    scene.frame_start, scene.frame_end = 1, 2
+    scene.sequence_editor_create().sequences.new_effect("Color", type="COLOR", channel=1, frame_start=1, frame_end=3)
+    bpy.ops.render.render(animation=True)
+    return render.frame_path(frame=scene.frame_start)
+
+
+def add_strips(scene, frames):
+    # Strips that need no media next to the file
+    sequence_editor = scene.sequence_editor_create()
+    strip = sequence_editor.sequences.new_effect("Color", type="COLOR", channel=1, frame_start=1, frame_end=frames + 1)
+    strip.color = (0.2, 0.3, 0.8)
+    sequence_editor.sequences.new_effect("Title", type="TEXT", channel=2, frame_start=1, frame_end=frames + 1)
+
+
+def add_movie_strip(scene, movie_path):
+    # The clip in the master directory by absolute path, so the copies
+    # benchmark.py makes for each size still find it
+    scene.sequence_editor_create().sequences.new_movie("Clip", movie_path, channel=3, frame_start=1)
+
+
+def build_file(params, rng, movie_path):
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene = bpy.context.scene
+    render = scene.render
+    if params["engine"] == "CYCLES":
+        render.engine = "CYCLES"
+        scene.cycles.samples = params["samples"]
+    else:
+        render.engine = eevee_engine()
+        scene.eevee.taa_render_samples = params["samples"]
+    render.resolution_x, render.resolution_y = params["resolution"]
+    render.filepath = "//render/"
+    scene.frame_start = 1
+    scene.frame_end = params["frames"]
+    scene.world = bpy.data.worlds.new("World")
+    add_objects(scene, params["objects"], rng)
+    if params["vse"]:
+        add_strips(scene, params["frames"])
+    if params["movie"]:
+        add_movie_strip(scene, movie_path)
+
+
+def generate(out_dir, count, seed):
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    movie_path = write_movie(out_dir)
+    files = []
+    for index in range(count):
+        params = file_params(index, rng)
+        build_file(params, rng, movie_path)
+        bpy.ops.wm.save_as_mainfile(
+            filepath=os.path.join(out_dir, params["name"]), compress=params["compressed"]
+        )
+        files.append(params)
+        print(f"[{index + 1}/{count}] {params['name']}", file=sys.stderr, flush=True)
+
+    manifest = {
+        "version": CORPUS_VERSION, "blender": bpy.app.version_string, "seed": seed, "files": files,
+    }
+    with open(os.path.join(out_dir, "corpus.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate .blend files for benchmark.py")
+    parser.add_argument("out_dir")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.out_dir, args.count, args.seed)
@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import struct
+
+# Protocol between the explorer and the Blender scripts (blender_loader.py
+# --worker, blender_save_script.py --manifest). Every record is a 4 byte big
+# endian length followed by a UTF-8 JSON object:
+#
+#   {"v": 1, "type": "hello",    "pid": ..., "blender": "4.3.0"}
+#   {"v": 1, "type": "load",     "path": ...}                      request
+#   {"v": 1, "type": "progress", "path": ..., "phase": ...}
+#   {"v": 1, "type": "result",   "path": ..., ...}
+#   {"v": 1, "type": "error",    "path": ..., "message": ...}
+#   {"v": 1, "type": "done"}
+#
+# Records go over the process' original stdout, which the script claims with
+# open_channel(); anything bpy prints after that ends up on stderr, so it can
+# never be mistaken for a record.
+
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct(">I")
+# A render_Settings record is a few KB, anything near this is garbage
+MAX_RECORD_SIZE = 64 * 1024 * 1024
+
+RECORD_TYPES = {"hello", "load", "progress", "result", "error", "done"}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_record(record_type, **fields):
+    if record_type not in RECORD_TYPES:
+        raise ProtocolError(f"Unknown record type {record_type!r}")
+    record = {"v": PROTOCOL_VERSION, "type": record_type}
+    record.update(fields)
+    body = json.dumps(record, separators=(",", ":")).encode("utf-8")
+    return HEADER.pack(len(body)) + body
+
+
+def decode_body(body):
+    try:
+        record = json.loads(body.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ProtocolError(f"Bad record: {e}")
+    if not isinstance(record, dict) or record.get("type") not in RECORD_TYPES:
+        raise ProtocolError(f"Bad record: {record!r}")
+    if record.get("v") != PROTOCOL_VERSION:
+        raise ProtocolError(
+            f"Protocol version {record.get('v')} is not supported (expected {PROTOCOL_VERSION})"
+        )
+    return record
+
+
+class FrameDecoder:
+    # Incremental parser: feed() whatever bytes arrived, get back the
+    # complete records. Never blocks and never needs the whole stream.
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        records = []
+        while len(self._buffer) >= HEADER.size:
+            (size,) = HEADER.unpack_from(self._buffer)
+            if size > MAX_RECORD_SIZE:
+                raise ProtocolError(f"Record of {size} bytes is too large")
+            end = HEADER.size + size
+            if len(self._buffer) < end:
+                break
+            records.append(decode_body(bytes(self._buffer[HEADER.size:end])))
+            del self._buffer[:end]
+        return records
+
+    def pending(self):
+        return len(self._buffer)
+
+
+class RecordReader:
+    # Reads records from a binary pipe as they arrive
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = FrameDecoder()
+        self.queue = []
+
+    def read(self):
+        # Next record, or None once the other side closed the pipe
+        while not self.queue:
+            chunk = self.stream.read1(65536) if hasattr(self.stream, "read1") else self.stream.read(65536)
+            if not chunk:
+                if self.decoder.pending():
+                    raise ProtocolError("Pipe closed in the middle of a record")
+                return None
+            self.queue.extend(self.decoder.feed(chunk))
+        return self.queue.pop(0)
+
+    def __iter__(self):
+        while True:
+            record = self.read()
+            if record is None:
+                return
+            yield record
+
+
+class RecordWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, record_type, **fields):
+        self.stream.write(encode_record(record_type, **fields))
+        self.stream.flush()
+
+
+def open_channel():
+    # Called by the Blender scripts before importing/using bpy output: keeps
+    # the real stdout for records only and sends fd 1 (C level prints from
+    # Blender) and sys.stdout to stderr from here on.
+    sys.stdout.flush()
+    channel_fd = os.dup(sys.stdout.fileno())
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    return RecordWriter(os.fdopen(channel_fd, "wb", buffering=0))
+
+
+# Engine names that take the EEVEE settings, EEVEE Next is
+# BLENDER_EEVEE_NEXT in 4.2 - 4.x
+EEVEE_ENGINES = ("BLENDER_EEVEE", "EEVEE", "BLENDER_EEVEE_NEXT")
+
+# Settings dict exchanged in result records and save manifests, as produced
+# by blender_loader.render_Settings. Values edited in the explorer arrive as
+# text, normalize_settings() turns them back into these types. "-" marks a
+# field that does not apply to the scene (e.g. EEVEE flags on Cycles).
+SETTINGS_SCHEMA = {
+    "FilePath": str,
+    "FileName": str,
+    "Render_Engine": str,
+    "blender_ver": list,
+    "Total_Frames": str,
+    "Render_Samples": int,
+    "Resolution_X": int,
+    "Resolution_Y": int,
+    "File_Path": str,
+    "World_Name": str,
+    "File_Format": str,
+    "Resolution_Percentage": int,
+    "Scene": str,
+    "have_seq": bool,
+    "w_comp": bool,
+    "noise_t": float,
+    "Ambient_Occlusion": bool,
+    "Subsurface_Reflection": bool,
+    "Simplify": bool,
+    "Bloom": bool,
+    "Motion_Blur": bool,
+    "Objects": int,
+    "Meshes": int,
+    "Polygons": int,
+    "View_Layers": str,
+    "Scenes": int,
+}
+# Settings of every scene in loader results: a list of settings dicts. In
+# save manifests, edits of scenes other than the active one: a dict of
+# scene name -> settings dict.
+ALL_SCENES_KEY = "All_Scenes"
+SCENE_EDITS_KEY = "Scene_Edits"
+
+
+def _coerce(key, value, expected):
+    if value == "-" or value is None:
+        return "-"
+    if expected is bool:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in ("true", "1", "yes", "false", "0", "no"):
+            return value.strip().lower() in ("true", "1", "yes")
+    elif expected is int:
+        if isinstance(value, bool):
+            raise ProtocolError(f"{key} must be a whole number, got {value!r}")
+        try:
+            return int(str(value).strip())
+        except ValueError:
+            pass
+    elif expected is float:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            pass
+    elif expected is list:
+        if isinstance(value, (list, tuple)):
+            return list(value)
+        if isinstance(value, str):
+            parts = value.strip("()[] ").split(",")
+            try:
+                return [int(part) for part in parts if part.strip()]
+            except ValueError:
+                pass
+    elif expected is str:
+        return str(value)
+    raise ProtocolError(f"{key} must be {expected.__name__}, got {value!r}")
+
+
+def normalize_settings(settings):
+    # Validate a settings dict against SETTINGS_SCHEMA. Unknown keys are
+    # kept as they are, so newer loaders can add fields.
+    if not isinstance(settings, dict):
+        raise ProtocolError(f"Settings must be a dict, got {type(settings).__name__}")
+    normalized = {}
+    for key, value in settings.items():
+        if key == ALL_SCENES_KEY:
+            if not isinstance(value, list):
+                raise ProtocolError(f"{key} must be a list, got {value!r}")
+            normalized[key] = [normalize_settings(scene) for scene in value]
+        elif key == SCENE_EDITS_KEY:
+            if not isinstance(value, dict):
+                raise ProtocolError(f"{key} must be a dict, got {value!r}")
+            normalized[key] = {str(name): normalize_settings(edits) for name, edits in value.items()}
+        else:
+            expected = SETTINGS_SCHEMA.get(key)
+            normalized[key] = value if expected is None else _coerce(key, value, expected)
+    return normalized
@@ -0,0 +1,251 @@
+import time
+import heapq
+import itertools
+import threading
+from process_tree import kill_process_tree
+
+# Central queue for everything that starts Blender. Jobs run in lanes, each
+# with its own threads and a priority queue (lower number first). A lane can
+# yield to others: thumbnails only start while no metadata is waiting, so
+# rows fill in before their previews. Saves have a lane of their own and
+# never wait behind a scan.
+#
+# A job gets the Job object as its only argument. Processes it registers
+# with job.track() are killed (with everything they started) when the job
+# runs over its timeout or is cancelled. Failed jobs are run again up to
+# `retries` times, unless they failed with JobTimeout. Qt free.
+
+PRIORITY_VISIBLE = 0
+PRIORITY_NORMAL = 10
+
+POLL_INTERVAL = 0.25
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobTimeout(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, lane, key, function, priority, timeout, retries, group, on_done):
+        self.lane = lane
+        self.key = key
+        self.function = function
+        self.priority = priority
+        self.timeout = timeout
+        self.retries = retries
+        self.group = group
+        self.on_done = on_done
+        self.attempts = 0
+        self.started = None
+        self.timed_out = False
+        self.cancel_event = threading.Event()
+        self._processes = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def track(self, process):
+        with self._lock:
+            stopped = self.cancelled or self.timed_out
+            if not stopped:
+                self._processes.append(process)
+        if stopped:
+            kill_process_tree(process)
+
+    def kill(self):
+        with self._lock:
+            processes, self._processes = self._processes, []
+        for process in processes:
+            kill_process_tree(process)
+
+
+class _Lane:
+    def __init__(self, name, size, yields_to):
+        self.name = name
+        self.size = size
+        self.yields_to = yields_to
+        self.heap = []
+        # key -> heap entry [priority, sequence, job] of the queued job
+        self.queued = {}
+        self.running = set()
+        self.threads = 0
+
+
+class JobScheduler:
+    def __init__(self, lanes):
+        # lanes: {name: (threads, [lanes it yields to])}
+        self._cond = threading.Condition()
+        self._sequence = itertools.count()
+        self._closed = False
+        self._lanes = {
+            name: _Lane(name, size, list(yields_to)) for name, (size, yields_to) in lanes.items()
+        }
+        for lane in self._lanes.values():
+            self._spawn(lane)
+        self._watchdog = threading.Thread(target=self._watch_timeouts, daemon=True)
+        self._watchdog.start()
+
+    def _spawn(self, lane):
+        while lane.threads < lane.size:
+            lane.threads += 1
+            threading.Thread(target=self._work, args=(lane,), daemon=True).start()
+
+    def set_lane_size(self, name, size):
+        with self._cond:
+            lane = self._lanes[name]
+            lane.size = max(1, size)
+            self._spawn(lane)
+            # Surplus threads exit when they are idle
+            self._cond.notify_all()
+
+    def submit(self, lane_name, key, function, priority=PRIORITY_NORMAL, timeout=None,
+               retries=0, group=None, on_done=None):
+        # on_done(job, result, error) is called on a worker thread, not for
+        # jobs that were cancelled. A key that is already queued in the lane
+        # only gets the better of both priorities.
+        with self._cond:
+            if self._closed:
+                raise JobCancelled("Scheduler is closed")
+            lane = self._lanes[lane_name]
+            entry = lane.queued.get(key)
+            if entry is not None:
+                self._push(lane, entry[2], min(priority, entry[0]))
+                return entry[2]
+            job = Job(lane_name, key, function, priority, timeout, retries, group, on_done)
+            self._push(lane, job, priority)
+            return job
+
+    def _push(self, lane, job, priority):
+        # Lazy removal: the old entry stays in the heap but is no longer the
+        # queued one, so it is skipped when it comes up
+        job.priority = priority
+        entry = [priority, next(self._sequence), job]
+        lane.queued[job.key] = entry
+        heapq.heappush(lane.heap, entry)
+        self._cond.notify_all()
+
+    def prioritize(self, lane_name, keys, priority=PRIORITY_VISIBLE):
+        # e.g. the rows that just scrolled into view
+        with self._cond:
+            lane = self._lanes[lane_name]
+            for key in keys:
+                entry = lane.queued.get(key)
+                if entry is not None and entry[0] > priority:
+                    self._push(lane, entry[2], priority)
+
+    def cancel_group(self, group):
+        # Queued jobs of the group are dropped, running ones are told to
+        # stop and their processes killed
+        running = []
+        with self._cond:
+            for lane in self._lanes.values():
+                for key, entry in list(lane.queued.items()):
+                    if entry[2].group == group:
+                        entry[2].cancel_event.set()
+                        del lane.queued[key]
+                if not lane.queued:
+                    lane.heap.clear()
+                running += [job for job in lane.running if job.group == group]
+        for job in running:
+            job.cancel_event.set()
+            job.kill()
+
+    def pending(self, lane_name):
+        with self._cond:
+            lane = self._lanes[lane_name]
+            return len(lane.queued) + len(lane.running)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            running = []
+            for lane in self._lanes.values():
+                for entry in lane.queued.values():
+                    entry[2].cancel_event.set()
+                lane.queued.clear()
+                lane.heap.clear()
+                running += list(lane.running)
+            self._cond.notify_all()
+        for job in running:
+            job.cancel_event.set()
+            job.kill()
+
+    def _can_start(self, lane):
+        return lane.queued and not any(self._lanes[name].queued for name in lane.yields_to)
+
+    def _next_job(self, lane):
+        # Called with the lock held, None when the thread should exit
+        while True:
+            if self._closed or lane.threads > lane.size:
+                lane.threads -= 1
+                return None
+            if self._can_start(lane):
+                entry = heapq.heappop(lane.heap)
+                job = entry[2]
+                if lane.queued.get(job.key) is not entry:
+                    continue
+                del lane.queued[job.key]
+                lane.running.add(job)
+                job.started = time.monotonic()
+                return job
+            self._cond.wait()
+
+    def _work(self, lane):
+        while True:
+            with self._cond:
+                job = self._next_job(lane)
+            if job is None:
+                return
+            job.attempts += 1
+            result, error = None, None
+            try:
+                result = job.function(job)
+            except Exception as e:
+                error = e
+            job.kill()
+            with self._cond:
+                lane.running.discard(job)
+                # A file that ran out of time would only do so again
+                retry = (
+                    error is not None
+                    and not isinstance(error, JobTimeout)
+                    and not job.timed_out
+                    and not job.cancelled
+                    and not self._closed
+                    and job.attempts <= job.retries
+                    and job.key not in lane.queued
+                )
+                if retry:
+                    self._push(lane, job, job.priority)
+                self._cond.notify_all()
+            if retry or job.cancelled:
+                continue
+            if job.timed_out:
+                result, error = None, JobTimeout(f"{job.key} took longer than {job.timeout}s")
+            if job.on_done is not None:
+                try:
+                    job.on_done(job, result, error)
+                except Exception as e:
+                    print(f"Job callback of {job.key} failed: {str(e)}")
+
+    def _watch_timeouts(self):
+        while True:
+            time.sleep(POLL_INTERVAL)
+            now = time.monotonic()
+            with self._cond:
+                if self._closed:
+                    return
+                expired = [
+                    job for lane in self._lanes.values() for job in lane.running
+                    if job.timeout and not job.timed_out and now - job.started > job.timeout
+                ]
+                for job in expired:
+                    job.timed_out = True
+            for job in expired:
+                job.kill()
@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import threading
+
+# Persistent cache of render_Settings results. An entry is valid as long as
+# the file still has the size and mtime it had when it was extracted, so
+# reopening a directory only re-extracts new or changed files.
+
+CACHE_DIR_ENV = "BLENDER_DIRECTORY_CHECKER_CACHE"
+
+
+def cache_dir():
+    # Per user cache directory, can be moved with an environment variable
+    path = os.environ.get(CACHE_DIR_ENV)
+    if not path:
+        if sys.platform == "win32":
+            base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        elif sys.platform == "darwin":
+            base = os.path.expanduser("~/Library/Caches")
+        else:
+            base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+        path = os.path.join(base, "BlenderDirectoryChecker")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_version(file_path):
+    # Changes whenever the file does (path, size, mtime), without reading it
+    stat = os.stat(file_path)
+    text = f"{os.path.abspath(file_path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def content_hash(file_path, chunk_size=1 << 20, stop=None):
+    # None when stop() turns true before the whole file was read
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            if stop is not None and stop():
+                return None
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MetadataCache:
+    # SQLite index keyed on absolute path, checked against size + mtime_ns.
+    # With use_hash=True a content hash is stored as well, so a file that was
+    # only touched or copied over with identical content stays cached.
+    # Safe to use from several threads and several processes.
+
+    def __init__(self, db_path=None, use_hash=False):
+        self.db_path = db_path or os.path.join(cache_dir(), "metadata.sqlite3")
+        self.use_hash = use_hash
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS render_settings (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT,
+                settings TEXT NOT NULL
+            )"""
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS content_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL
+            )"""
+        )
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def get(self, file_path):
+        file_path = os.path.abspath(file_path)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, content_hash, settings FROM render_settings WHERE path = ?",
+                (file_path,),
+            ).fetchone()
+        if row is None:
+            return None
+        size, mtime_ns, stored_hash, settings = row
+        if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+            return json.loads(settings)
+        if self.use_hash and stored_hash and size == stat.st_size:
+            if content_hash(file_path) == stored_hash:
+                with self._lock:
+                    self._db.execute(
+                        "UPDATE render_settings SET mtime_ns = ? WHERE path = ?",
+                        (stat.st_mtime_ns, file_path),
+                    )
+                    self._db.commit()
+                return json.loads(settings)
+        return None
+
+    def put(self, file_path, settings, stat=None):
+        # `stat` is os.stat() of the file from before the settings were
+        # extracted. A file saved since then is not stored, the settings may
+        # be of either version and the next scan extracts it again.
+        file_path = os.path.abspath(file_path)
+        try:
+            current = os.stat(file_path)
+        except OSError:
+            return
+        if stat is None:
+            stat = current
+        elif (stat.st_size, stat.st_mtime_ns) != (current.st_size, current.st_mtime_ns):
+            return
+        digest = content_hash(file_path) if self.use_hash else None
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO render_settings VALUES (?, ?, ?, ?, ?)",
+                (file_path, stat.st_size, stat.st_mtime_ns, digest, json.dumps(settings)),
+            )
+            self._db.commit()
+
+    def content_hash(self, file_path, stop=None):
+        # content_hash() of the file, only read again when its size or mtime
+        # changed. Raises OSError when the file cannot be read, None when
+        # stop() turned true during the read.
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, content_hash FROM content_hashes WHERE path = ?", (file_path,)
+            ).fetchone()
+        if row is not None and row[:2] == (stat.st_size, stat.st_mtime_ns):
+            return row[2]
+        digest = content_hash(file_path, stop=stop)
+        if digest is None:
+            return None
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO content_hashes VALUES (?, ?, ?, ?)",
+                (file_path, stat.st_size, stat.st_mtime_ns, digest),
+            )
+            self._db.commit()
+        return digest
+
+    def invalidate(self, file_path):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM render_settings WHERE path = ?", (os.path.abspath(file_path),)
+            )
+            self._db.commit()
+
+    def prune(self, dir_path=None):
+        # Drop entries of files that no longer exist (below dir_path if given)
+        with self._lock:
+            if dir_path is None:
+                paths = self._db.execute("SELECT path FROM render_settings").fetchall()
+            else:
+                prefix = os.path.join(os.path.abspath(dir_path), "")
+                paths = self._db.execute(
+                    "SELECT path FROM render_settings WHERE substr(path, 1, ?) = ?",
+                    (len(prefix), prefix),
+                ).fetchall()
+        stale = [(path,) for (path,) in paths if not os.path.exists(path)]
+        with self._lock:
+            if dir_path is None:
+                hashed = self._db.execute("SELECT path FROM content_hashes").fetchall()
+            else:
+                hashed = self._db.execute(
+                    "SELECT path FROM content_hashes WHERE substr(path, 1, ?) = ?",
+                    (len(prefix), prefix),
+                ).fetchall()
+        stale_hashes = [(path,) for (path,) in hashed if not os.path.exists(path)]
+        if stale or stale_hashes:
+            with self._lock:
+                self._db.executemany("DELETE FROM render_settings WHERE path = ?", stale)
+                self._db.executemany("DELETE FROM content_hashes WHERE path = ?", stale_hashes)
+                self._db.commit()
+        return len(stale)
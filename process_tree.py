@@ -0,0 +1,50 @@
+import os
+import sys
+import signal
+import subprocess
+
+# Blender processes are started in a process group of their own, so a
+# timeout or cancel can take down everything they started as well.
+
+
+def group_options():
+    # Popen keyword arguments for a new process group
+    if sys.platform == "win32":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def kill_process_tree(process):
+    if process.poll() is not None:
+        return
+    try:
+        if sys.platform == "win32":
+            subprocess.run(
+                ["taskkill", "/T", "/F", "/PID", str(process.pid)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30,
+            )
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (OSError, subprocess.SubprocessError):
+        pass
+    # Not started in a group of its own, or taskkill is missing
+    if process.poll() is None:
+        try:
+            process.kill()
+        except OSError:
+            pass
+
+
+def run_process(args, timeout=None, on_process=None, **popen_args):
+    # subprocess.run() that kills the whole tree on timeout. on_process is
+    # called with the Popen object, e.g. so a scheduler can kill it too.
+    process = subprocess.Popen(args, **popen_args, **group_options())
+    if on_process is not None:
+        on_process(process)
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        kill_process_tree(process)
+        process.wait()
+        raise
+    return process.returncode
@@ -1,29 +1,110 @@
-import bpy
 import sys
 import os
+import argparse
+import threading
+from tracing import span
+with span("import_bpy"):
+    import bpy
+from thumbnails import extract_embedded_thumbnail, is_up_to_date
 
-def render_thumbnail(blend_file, output_dir):
+# Exit code when a render runs over its time budget
+BUDGET_EXCEEDED = 3
+
+def start_watchdog(budget):
+    # A render cannot be interrupted from Python, so when it runs over the
+    # budget the whole process goes. The caller falls back to no thumbnail.
+    def expire():
+        print(f"Thumbnail render took longer than {budget}s, giving up", file=sys.stderr, flush=True)
+        os._exit(BUDGET_EXCEEDED)
+
+    timer = threading.Timer(budget, expire)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+def eevee_engine():
+    # EEVEE Next is called BLENDER_EEVEE_NEXT in 4.2 - 4.x
+    engines = bpy.types.RenderSettings.bl_rna.properties["engine"].enum_items.keys()
+    return "BLENDER_EEVEE_NEXT" if "BLENDER_EEVEE_NEXT" in engines else "BLENDER_EEVEE"
+
+def apply_preview_profile(scene, size, engine):
+    # Cheapest render that still looks like the shot: fast engine, target
+    # size, simplify on, no compositor, denoiser or motion blur
+    render = scene.render
+    if engine == "EEVEE":
+        render.engine = eevee_engine()
+        scene.eevee.taa_render_samples = 8
+    else:
+        render.engine = "BLENDER_WORKBENCH"
+
+    # Longest side at the thumbnail size, same aspect as the shot
+    width, height = render.resolution_x, render.resolution_y
+    scale = size / max(width, height, 1)
+    render.resolution_x = max(1, round(width * scale))
+    render.resolution_y = max(1, round(height * scale))
+    render.resolution_percentage = 100
+
+    render.use_simplify = True
+    render.simplify_subdivision_render = min(render.simplify_subdivision_render, 1)
+    render.simplify_child_particles_render = min(render.simplify_child_particles_render, 0.1)
+    if hasattr(render, "simplify_volumes"):
+        render.simplify_volumes = min(render.simplify_volumes, 0.25)
+
+    render.use_compositing = False
+    render.use_sequencer = False
+    scene.use_nodes = False
+    render.use_motion_blur = False
+    if hasattr(scene.eevee, "use_motion_blur"):
+        scene.eevee.use_motion_blur = False
+    if hasattr(scene, "cycles"):
+        scene.cycles.use_denoising = False
+    render.use_stamp = False
+
+def apply_full_profile(scene):
+    scene.render.resolution_x = 1280
+    scene.render.resolution_y = 720
+    scene.render.resolution_percentage = 75
+    bpy.data.scenes[scene.name].cycles.samples = 128
+    bpy.data.scenes[scene.name].render.use_stamp = True
+
+def render_thumbnail(blend_file, output_dir, profile="full", size=128, engine="WORKBENCH", budget=None, thumbnail_path=None):
     # Open the .blend file
-    thumbnail_path = os.path.join(output_dir, f"{os.path.basename(blend_file)}_thumbnail.png")
-    if os.path.exists(thumbnail_path):
+    thumbnail_path = thumbnail_path or os.path.join(output_dir, f"{os.path.basename(blend_file)}_thumbnail.png")
+    if is_up_to_date(thumbnail_path, blend_file):
+        return thumbnail_path
+    # The preview saved inside the file is all we need, if there is one
+    if extract_embedded_thumbnail(blend_file, thumbnail_path):
         return thumbnail_path
-    bpy.ops.wm.open_mainfile(filepath=blend_file)
-    os.path.basename(blend_file)
+    if budget:
+        start_watchdog(budget)
+    with span("open_mainfile", blend_file):
+        bpy.ops.wm.open_mainfile(filepath=blend_file)
     # Set up the render settings for the thumbnail
     scene = bpy.context.scene
-    scene.render.resolution_x = 1280
-    scene.render.resolution_y = 720
-    scene.render.resolution_percentage = 75
+    if profile == "preview":
+        apply_preview_profile(scene, size, engine)
+    else:
+        apply_full_profile(scene)
     scene.render.image_settings.file_format = 'PNG'
     scene.render.filepath = thumbnail_path
-    bpy.data.scenes[scene.name].cycles.samples = 128
-    bpy.data.scenes[scene.name].render.use_stamp = True
 
     # Render the thumbnail
-    bpy.ops.render.render(write_still=True)
+    with span("render", blend_file, profile=profile):
+        bpy.ops.render.render(write_still=True)
     return thumbnail_path
 
 if __name__ == "__main__":
-    blend_file = sys.argv[1]
-    output_dir = sys.argv[2]
-    render_thumbnail(blend_file, output_dir)
+    parser = argparse.ArgumentParser(description="Render a thumbnail of a .blend file")
+    parser.add_argument("blend_file")
+    parser.add_argument("output_dir")
+    parser.add_argument("--profile", choices=["full", "preview"], default="full",
+                        help="preview: fast engine at thumbnail size, simplify on, no compositor/denoise/motion blur")
+    parser.add_argument("--size", type=int, default=128, help="longest side of a preview render in pixels")
+    parser.add_argument("--engine", choices=["WORKBENCH", "EEVEE"], default="WORKBENCH",
+                        help="engine of the preview profile")
+    parser.add_argument("--budget", type=float, default=None,
+                        help="seconds a render may take before it is killed")
+    parser.add_argument("--output", default=None,
+                        help="PNG to write instead of <blend file>_thumbnail.png in output_dir")
+    args = parser.parse_args()
+    render_thumbnail(args.blend_file, args.output_dir, args.profile, args.size, args.engine, args.budget, args.output)
@@ -0,0 +1,173 @@
+import os
+import fnmatch
+import argparse
+import threading
+from flask import Flask, jsonify, request, send_file
+from worker_pool import LoaderPool, LoaderError, LoaderTimeout, load_render_settings
+from metadata_cache import MetadataCache, cache_dir, file_version
+from thumbnails import ensure_thumbnail, thumbnail_path_for
+from directory_scan import DEFAULT_INCLUDE
+from tracing import span
+
+# Optional HTTP service that does the Blender work for several explorers,
+# so a folder opened by ten people is only extracted once:
+#
+#   python scan_service.py --root /projects/show --port 8765 --workers 8
+#
+#   GET /health
+#   GET /settings?path=<.blend>    render_Settings as JSON
+#   GET /thumbnail?path=<.blend>   PNG, ETag is the file version
+#
+# Results are cached on path + size + mtime (metadata in the MetadataCache,
+# thumbnails named after the file version). Requests for a file that is
+# already being worked on wait for that result instead of starting again.
+# Paths are the server's: clients have to see the files under the same path.
+# Only .blend files below the --root directories are served (symlinks are
+# followed first), anything else is refused before it is looked at. The
+# service listens on 127.0.0.1 unless --host says otherwise; it has no
+# authentication, only open it to networks whose clients may read the roots.
+
+DEFAULT_PORT = 8765
+# Seconds Blender may spend on the settings of one file, like the explorer
+LOAD_TIMEOUT = 120
+SERVICE_VERSION = 1
+
+
+class InFlight:
+    # Runs function() once per key at a time; concurrent callers with the
+    # same key get the result (or the exception) of the running call
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def run(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            owner = call is None
+            if owner:
+                call = self._calls[key] = {"done": threading.Event()}
+        if not owner:
+            call["done"].wait()
+        else:
+            try:
+                call["result"] = function()
+            except Exception as e:
+                call["error"] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call["done"].set()
+        if "error" in call:
+            raise call["error"]
+        return call["result"]
+
+
+def is_below(path, roots):
+    return any(os.path.commonpath([path, root]) == root for root in roots)
+
+
+def create_app(roots, loader_pool=None, metadata_cache=None, thumbnail_dir=None, load_timeout=LOAD_TIMEOUT):
+    # roots: the directories whose .blend files may be served
+    app = Flask(__name__)
+    roots = [os.path.realpath(root) for root in roots]
+    if not roots:
+        raise ValueError("The scan service needs at least one root directory")
+    loader_pool = loader_pool or LoaderPool()
+    metadata_cache = metadata_cache or MetadataCache()
+    thumbnail_dir = thumbnail_dir or os.path.join(cache_dir(), "service_thumbnails")
+    in_flight = InFlight()
+    # Thumbnail renders are Blender processes too, as many as loaders
+    render_slots = threading.BoundedSemaphore(loader_pool.size)
+
+    def render_thumbnail(file_path):
+        # The digest reads the whole file when it changed, once for all the
+        # requests waiting on this call
+        preview_path = thumbnail_path_for(file_path, thumbnail_dir, metadata_cache.content_hash(file_path))
+        with render_slots:
+            return ensure_thumbnail(file_path, preview_path)
+
+    app.config.update(LOADER_POOL=loader_pool, METADATA_CACHE=metadata_cache)
+
+    def blend_path():
+        file_path = request.args.get("path", "")
+        name = os.path.basename(file_path)
+        if not any(fnmatch.fnmatch(name, pattern) for pattern in DEFAULT_INCLUDE):
+            return None, (jsonify(error="path must be a .blend file"), 400)
+        file_path = os.path.realpath(file_path)
+        # Refused before it is looked at, so the answer tells nothing about
+        # files outside the roots
+        if not is_below(file_path, roots):
+            return None, (jsonify(error="path is outside the served directories"), 403)
+        if not os.path.isfile(file_path):
+            return None, (jsonify(error=f"{file_path} does not exist"), 404)
+        return file_path, None
+
+    @app.get("/health")
+    def health():
+        return jsonify(ok=True, version=SERVICE_VERSION, workers=loader_pool.size)
+
+    @app.get("/settings")
+    def settings():
+        file_path, error = blend_path()
+        if error:
+            return error
+        version = file_version(file_path)
+        try:
+            with span("service_settings", file_path):
+                result = in_flight.run(
+                    ("settings", version),
+                    lambda: load_render_settings(file_path, loader_pool, metadata_cache, load_timeout),
+                )
+        except LoaderTimeout as e:
+            return jsonify(error=str(e)), 504
+        except LoaderError as e:
+            return jsonify(error=str(e)), 422
+        response = jsonify(result)
+        response.set_etag(version)
+        return response
+
+    @app.get("/thumbnail")
+    def thumbnail():
+        file_path, error = blend_path()
+        if error:
+            return error
+        version = file_version(file_path)
+        if request.if_none_match.contains(version):
+            return "", 304
+        try:
+            with span("service_thumbnail", file_path):
+                result = in_flight.run(("thumbnail", version), lambda: render_thumbnail(file_path))
+        except OSError:
+            # Removed or made unreadable since blend_path() looked
+            return jsonify(error=f"{file_path} cannot be read"), 404
+        if result is None:
+            return jsonify(error=f"No thumbnail for {file_path}"), 404
+        response = send_file(result, mimetype="image/png", etag=False)
+        response.set_etag(version)
+        return response
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve render settings and thumbnails of .blend files")
+    parser.add_argument("--root", action="append", required=True,
+                        help="directory whose .blend files may be served, can be given more than once")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address to listen on, 0.0.0.0 opens the service to the network")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="resident Blender loader processes")
+    parser.add_argument("--timeout", type=float, default=LOAD_TIMEOUT,
+                        help="seconds Blender may spend on the settings of one file")
+    args = parser.parse_args()
+
+    loader_pool = LoaderPool(size=args.workers)
+    metadata_cache = MetadataCache()
+    try:
+        app = create_app(args.root, loader_pool, metadata_cache, load_timeout=args.timeout)
+        app.run(host=args.host, port=args.port, threaded=True)
+    finally:
+        loader_pool.close()
+        metadata_cache.close()
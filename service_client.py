@@ -0,0 +1,92 @@
+import os
+import json
+import hashlib
+import urllib.error
+import urllib.parse
+import urllib.request
+from metadata_cache import cache_dir
+
+# Client of scan_service.py, standard library only. The explorer uses it
+# in service mode instead of starting Blender processes itself.
+
+
+class ServiceError(Exception):
+    pass
+
+
+class ServiceClient:
+    def __init__(self, base_url, timeout=600, thumbnail_dir=None):
+        self.base_url = base_url.rstrip("/")
+        if "://" not in self.base_url:
+            self.base_url = f"http://{self.base_url}"
+        # Long enough for a cold extraction or render on the service
+        self.timeout = timeout
+        self.thumbnail_dir = thumbnail_dir or os.path.join(cache_dir(), "client_thumbnails")
+
+    def _request(self, endpoint, file_path=None, headers=None):
+        url = f"{self.base_url}/{endpoint}"
+        if file_path is not None:
+            url += "?" + urllib.parse.urlencode({"path": os.path.abspath(file_path)})
+        try:
+            return urllib.request.urlopen(
+                urllib.request.Request(url, headers=headers or {}), timeout=self.timeout
+            )
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return e
+            try:
+                message = json.loads(e.read()).get("error")
+            except ValueError:
+                message = None
+            raise ServiceError(message or f"{url} answered {e.code}")
+        except (urllib.error.URLError, OSError) as e:
+            raise ServiceError(f"Scan service at {self.base_url} is not reachable: {e}")
+
+    def health(self):
+        with self._request("health") as response:
+            return json.loads(response.read())
+
+    def load_render_settings(self, file_path):
+        with self._request("settings", file_path) as response:
+            return json.loads(response.read())
+
+    def ensure_thumbnail(self, file_path):
+        # Local copy of the service's thumbnail, downloaded again only when
+        # the file changed. Named after the ETag (the file version) like the
+        # local thumbnails, the path of a file remembers the last one. None
+        # if there is no thumbnail.
+        os.makedirs(self.thumbnail_dir, exist_ok=True)
+        name = hashlib.blake2b(os.path.abspath(file_path).encode("utf-8"), digest_size=16).hexdigest()
+        etag_path = os.path.join(self.thumbnail_dir, f"{name}.etag")
+        headers = {}
+        old_path = None
+        if os.path.exists(etag_path):
+            with open(etag_path, "r", encoding="utf-8") as f:
+                etag = f.read().strip()
+            old_path = self.preview_path_for(etag)
+            if os.path.exists(old_path):
+                headers["If-None-Match"] = etag
+        try:
+            response = self._request("thumbnail", file_path, headers)
+        except ServiceError as e:
+            print(f"No thumbnail for {file_path}: {str(e)}")
+            return None
+        with response:
+            if response.status == 304:
+                return old_path
+            data = response.read()
+            etag = response.headers.get("ETag", "")
+        preview_path = self.preview_path_for(etag)
+        temp_path = f"{preview_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, preview_path)
+        with open(etag_path, "w", encoding="utf-8") as f:
+            f.write(etag)
+        if old_path is not None and old_path != preview_path and os.path.exists(old_path):
+            os.remove(old_path)
+        return preview_path
+
+    def preview_path_for(self, etag):
+        name = etag.strip('"').replace("/", "_") or "none"
+        return os.path.join(self.thumbnail_dir, f"{name}.png")
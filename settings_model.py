@@ -0,0 +1,472 @@
+import os
+from collections import OrderedDict
+from PySide6.QtWidgets import (
+    QStyledItemDelegate, QComboBox, QStyle, QStyleOptionButton, QApplication
+)
+from PySide6.QtGui import QPixmap, QFont, QImageReader
+from PySide6.QtCore import (
+    Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, Signal, QEvent, QSize
+)
+from ipc import ProtocolError, normalize_settings, ALL_SCENES_KEY
+
+SELECT_COLUMN = "Select"
+SAVE_COLUMN = "Save File"
+PREVIEW_COLUMN = "Preview"
+PREVIEW_SIZE = 64
+
+# Shown but not editable, they describe the file or scene rather than its
+# settings
+READ_ONLY_KEYS = {
+    "FilePath", "FileName", "blender_ver", "Scene", "Scenes", "Objects", "Meshes", "Polygons", "View_Layers",
+}
+# Column whose tooltip lists every scene of the file
+SCENES_KEY = "Scenes"
+# Offered as a drop down instead of free text
+FORMAT_CHOICES = ["FFMPEG", "PNG"]
+
+# Bytes of decoded previews kept in memory, can be changed in megabytes
+# with the environment variable
+PIXMAP_BUDGET_ENV = "BLENDER_DIRECTORY_CHECKER_PIXMAP_MB"
+PIXMAP_BUDGET = 32 * 1024 * 1024
+
+
+def pixmap_budget():
+    try:
+        return int(float(os.environ[PIXMAP_BUDGET_ENV]) * 1024 * 1024)
+    except (KeyError, ValueError):
+        return PIXMAP_BUDGET
+
+
+class PixmapCache:
+    # LRU of decoded previews, keyed on the preview path, that drops the
+    # least recently painted ones once they take more than `budget` bytes.
+    # Rows scrolled out of view are decoded again when they come back.
+
+    def __init__(self, budget=None):
+        self.budget = pixmap_budget() if budget is None else budget
+        self.size = 0
+        self.pixmaps = OrderedDict()
+
+    @staticmethod
+    def cost(pixmap):
+        if pixmap is None:
+            return 0
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    def get(self, key):
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        self.pop(key)
+        self.pixmaps[key] = pixmap
+        self.size += self.cost(pixmap)
+        while self.size > self.budget and len(self.pixmaps) > 1:
+            _, evicted = self.pixmaps.popitem(last=False)
+            self.size -= self.cost(evicted)
+
+    def pop(self, key):
+        pixmap = self.pixmaps.pop(key, None)
+        self.size -= self.cost(pixmap)
+
+    def clear(self):
+        self.pixmaps.clear()
+        self.size = 0
+
+
+def load_preview(preview_path, size=PREVIEW_SIZE):
+    # Decoded straight at the size it is shown, never at full resolution
+    reader = QImageReader(preview_path)
+    original = reader.size()
+    if original.isValid():
+        reader.setScaledSize(original.scaled(QSize(size, size), Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return None
+    return QPixmap.fromImage(image)
+
+
+class SettingsTableModel(QAbstractTableModel):
+    # One row per .blend file. Values are kept column by column (one list
+    # per render_Settings key) instead of one widget or item per cell, so
+    # 10k+ rows stay cheap; the view only asks for the cells it shows.
+    # `originals` holds the values as extracted, next to the edited ones in
+    # `columns`, so changes_for() knows what a save actually has to write.
+    save_requested = Signal(str)
+    value_edited = Signal(str, str, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.keys = []
+        self.columns = {}
+        self.originals = {}
+        self.paths = []
+        self.checked = []
+        self.previews = []
+        self.errors = []
+        # Found by the scan, settings not loaded yet
+        self.pending = []
+        # All_Scenes of every row, not a column
+        self.scenes = []
+        self.rows_by_path = {}
+        self.pixmaps = PixmapCache()
+        self.edited_font = QFont()
+        self.edited_font.setBold(True)
+
+    # Layout: Select | render_Settings keys... | Save File | Preview
+    def headers(self):
+        return [SELECT_COLUMN] + self.keys + [SAVE_COLUMN, PREVIEW_COLUMN]
+
+    def key_for_column(self, column):
+        if 1 <= column <= len(self.keys):
+            return self.keys[column - 1]
+        return None
+
+    def column_for_key(self, key):
+        return self.keys.index(key) + 1 if key in self.columns else -1
+
+    def save_column(self):
+        return len(self.keys) + 1
+
+    def preview_column(self):
+        return len(self.keys) + 2
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.keys) + 3
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            headers = self.headers()
+            if section < len(headers):
+                return headers[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if column == 0:
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if self.checked[row] else Qt.Unchecked
+            if role == Qt.ToolTipRole:
+                if self.pending[row]:
+                    return f"Loading {self.paths[row]}"
+                return self.errors[row] or self.paths[row]
+            return None
+        if column == self.save_column():
+            # Drawn by SettingsDelegate, no text so the filter skips it
+            return None
+        if column == self.preview_column():
+            if role == Qt.DecorationRole:
+                return self.preview_pixmap(row)
+            return None
+        key = self.key_for_column(column)
+        value = self.columns[key][row]
+        if role == Qt.DisplayRole:
+            return "" if value is None else str(value)
+        if role == Qt.EditRole:
+            return value
+        if role == Qt.FontRole and value != self.originals[key][row]:
+            return self.edited_font
+        if role == Qt.ToolTipRole and value != self.originals[key][row]:
+            return f"Was {self.originals[key][row]}"
+        if role == Qt.ToolTipRole and key == SCENES_KEY:
+            return self.scene_summary(row)
+        return None
+
+    def scene_summary(self, row):
+        lines = []
+        for scene in self.scenes[row] or []:
+            lines.append(
+                f"{scene.get('Scene')}: {scene.get('Render_Engine')} "
+                f"{scene.get('Resolution_X')}x{scene.get('Resolution_Y')}, "
+                f"{scene.get('Objects')} objects, {scene.get('Polygons')} polygons, "
+                f"view layers {scene.get('View_Layers')}"
+            )
+        return "\n".join(lines) or None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        row, column = index.row(), index.column()
+        if not self.is_ready(row):
+            return flags
+        if column == 0:
+            return flags | Qt.ItemIsUserCheckable
+        key = self.key_for_column(column)
+        if key is not None and key not in READ_ONLY_KEYS:
+            return flags | Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid():
+            return False
+        row, column = index.row(), index.column()
+        if column == 0 and role == Qt.CheckStateRole:
+            self.checked[row] = Qt.CheckState(value) == Qt.Checked
+            self.dataChanged.emit(index, index, [role])
+            return True
+        key = self.key_for_column(column)
+        if key is None or role != Qt.EditRole:
+            return False
+        # Typed like the extracted values, so "64" is no change from 64
+        try:
+            value = normalize_settings({key: value})[key]
+        except ProtocolError as e:
+            print(f"Not changing {key}: {str(e)}")
+            return False
+        if self.columns[key][row] == value:
+            return False
+        self.columns[key][row] = value
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole, Qt.FontRole])
+        self.value_edited.emit(self.paths[row], key, value)
+        return True
+
+    def add_keys(self, keys):
+        new_keys = [key for key in keys if key not in self.columns]
+        if not new_keys:
+            return
+        # New columns go in front of Save File / Preview
+        first = len(self.keys) + 1
+        self.beginInsertColumns(QModelIndex(), first, first + len(new_keys) - 1)
+        for key in new_keys:
+            self.keys.append(key)
+            self.columns[key] = [None] * len(self.paths)
+            self.originals[key] = [None] * len(self.paths)
+        self.endInsertColumns()
+
+    def upsert_file(self, file_path, settings, preview_path=None, error=None, pending=False):
+        # Rescanned files replace their row, new files are appended. The
+        # preview of an existing row is kept unless a new one is given.
+        self.add_keys([key for key in settings if key != ALL_SCENES_KEY])
+        scenes = settings.get(ALL_SCENES_KEY)
+        row = self.rows_by_path.get(file_path)
+        if row is None:
+            row = len(self.paths)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.paths.append(file_path)
+            self.checked.append(False)
+            self.previews.append(preview_path)
+            self.errors.append(error)
+            self.pending.append(pending)
+            self.scenes.append(scenes)
+            for key in self.keys:
+                self.columns[key].append(settings.get(key))
+                self.originals[key].append(settings.get(key))
+            self.rows_by_path[file_path] = row
+            self.endInsertRows()
+            return row
+        if preview_path is not None:
+            self.previews[row] = preview_path
+        self.errors[row] = error
+        self.pending[row] = pending
+        self.scenes[row] = scenes
+        # What is on disk now, edits of the old version do not apply to it
+        for key in self.keys:
+            self.columns[key][row] = settings.get(key)
+            self.originals[key][row] = settings.get(key)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+        return row
+
+    def add_pending(self, file_path):
+        # Placeholder row for a file the scan found, filled in by upsert_file
+        if file_path in self.rows_by_path:
+            return self.rows_by_path[file_path]
+        settings = {"FilePath": file_path, "FileName": os.path.basename(file_path)}
+        return self.upsert_file(file_path, settings, pending=True)
+
+    def set_preview(self, file_path, preview_path):
+        row = self.rows_by_path.get(file_path)
+        if row is None:
+            return
+        self.previews[row] = preview_path
+        index = self.index(row, self.preview_column())
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def mark_failed(self, file_path, error):
+        # Keeps the row (and whatever it showed before) but disables it
+        row = self.rows_by_path.get(file_path)
+        if row is None:
+            settings = {"FilePath": file_path, "FileName": os.path.basename(file_path)}
+            return self.upsert_file(file_path, settings, None, error)
+        self.errors[row] = error
+        self.pending[row] = False
+        self.checked[row] = False
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+        return row
+
+    def remove_file(self, file_path):
+        row = self.rows_by_path.get(file_path)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        lists = [self.paths, self.checked, self.previews, self.errors, self.pending, self.scenes]
+        for values in lists + list(self.columns.values()) + list(self.originals.values()):
+            del values[row]
+        self.rows_by_path = {path: index for index, path in enumerate(self.paths)}
+        self.endRemoveRows()
+
+    def remove_pending(self):
+        # Drops every row still waiting for its settings in one pass, e.g.
+        # when a scan is cancelled
+        keep = [row for row, pending in enumerate(self.pending) if not pending]
+        if len(keep) == len(self.paths):
+            return
+        self.beginResetModel()
+        lists = [self.paths, self.checked, self.previews, self.errors, self.pending, self.scenes]
+        for values in lists + list(self.columns.values()) + list(self.originals.values()):
+            values[:] = [values[row] for row in keep]
+        self.rows_by_path = {path: index for index, path in enumerate(self.paths)}
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self.keys = []
+        self.columns = {}
+        self.originals = {}
+        self.paths = []
+        self.checked = []
+        self.previews = []
+        self.errors = []
+        self.pending = []
+        self.scenes = []
+        self.rows_by_path = {}
+        self.pixmaps.clear()
+        self.endResetModel()
+
+    def row_of(self, file_path):
+        return self.rows_by_path.get(file_path)
+
+    def changes_for(self, row):
+        # Only the fields edited to something else than they were
+        return {
+            key: self.columns[key][row]
+            for key in self.keys
+            if self.columns[key][row] != self.originals[key][row]
+        }
+
+    def mark_saved(self, file_path):
+        # The edits are what the file holds now
+        row = self.rows_by_path.get(file_path)
+        if row is None:
+            return
+        for key in self.keys:
+            self.originals[key][row] = self.columns[key][row]
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1), [Qt.FontRole])
+
+    def checked_rows(self):
+        return [row for row, checked in enumerate(self.checked) if checked and self.is_ready(row)]
+
+    def is_ready(self, row):
+        # Loaded without errors, so it can be edited and saved
+        return not self.errors[row] and not self.pending[row]
+
+    def preview_pixmap(self, row):
+        # Only asked for rows on screen, so rows never scrolled to cost
+        # nothing. Preview paths name a file version, a cached pixmap is
+        # never out of date.
+        preview_path = self.previews[row]
+        if not preview_path:
+            return None
+        pixmap = self.pixmaps.get(preview_path)
+        if pixmap is None and os.path.exists(preview_path):
+            pixmap = load_preview(preview_path)
+            if pixmap is not None:
+                self.pixmaps.put(preview_path, pixmap)
+        return pixmap
+
+
+class SettingsFilterProxyModel(QSortFilterProxyModel):
+    # Sorts on the raw values (numbers as numbers) and filters on any column
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.setFilterKeyColumn(-1)
+        self.setSortRole(Qt.EditRole)
+
+    def lessThan(self, left, right):
+        left_value = left.data(Qt.EditRole)
+        right_value = right.data(Qt.EditRole)
+        try:
+            return left_value < right_value
+        except TypeError:
+            return str(left_value) < str(right_value)
+
+
+class SettingsDelegate(QStyledItemDelegate):
+    # Editors are only created while a cell is being edited: a drop down for
+    # booleans and the output format, the default line edit for the rest.
+    # The Save File column is painted as a button instead of holding one.
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.model = model
+
+    def source_index(self, index):
+        model = index.model()
+        return model.mapToSource(index) if hasattr(model, "mapToSource") else index
+
+    def choices(self, index):
+        source = self.source_index(index)
+        value = source.data(Qt.EditRole)
+        if isinstance(value, bool):
+            return ["True", "False"]
+        if self.model.key_for_column(source.column()) == "File_Format" and value in FORMAT_CHOICES:
+            return FORMAT_CHOICES
+        return None
+
+    def createEditor(self, parent, option, index):
+        choices = self.choices(index)
+        if choices is None:
+            return super().createEditor(parent, option, index)
+        combo_box = QComboBox(parent)
+        combo_box.addItems(choices)
+        # Commit as soon as something is picked
+        combo_box.activated.connect(lambda _: self.commitData.emit(combo_box))
+        return combo_box
+
+    def setEditorData(self, editor, index):
+        if isinstance(editor, QComboBox):
+            editor.setCurrentText(str(index.data(Qt.EditRole)))
+            return
+        super().setEditorData(editor, index)
+
+    def setModelData(self, editor, model, index):
+        if isinstance(editor, QComboBox):
+            text = editor.currentText()
+            value = text == "True" if text in ("True", "False") else text
+            model.setData(index, value, Qt.EditRole)
+            return
+        super().setModelData(editor, model, index)
+
+    def paint(self, painter, option, index):
+        source = self.source_index(index)
+        if source.column() != self.model.save_column():
+            return super().paint(painter, option, index)
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = SAVE_COLUMN
+        button.state = QStyle.State_Raised
+        if self.model.is_ready(source.row()):
+            button.state |= QStyle.State_Enabled
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def editorEvent(self, event, model, option, index):
+        source = self.source_index(index)
+        if (
+            source.column() == self.model.save_column()
+            and event.type() == QEvent.MouseButtonRelease
+            and option.rect.contains(event.position().toPoint())
+        ):
+            if self.model.is_ready(source.row()):
+                self.model.save_requested.emit(self.model.paths[source.row()])
+            return True
+        return super().editorEvent(event, model, option, index)
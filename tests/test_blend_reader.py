@@ -0,0 +1,128 @@
+import os
+import gzip
+import shutil
+import struct
+import tempfile
+import unittest
+from blend_reader import BlendReadError, read_preview, read_render_settings, missing_render_settings
+
+TEST_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_file", "my copy.blend")
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def preview_file(width, height, large_header=False):
+    # Just the start of a .blend file: header, REND block, TEST block. The
+    # preview pixels are stored bottom row first.
+    rows = [bytes([row, 0, 0, 255]) * width for row in range(height)]
+    preview = struct.pack("<ii", width, height) + b"".join(reversed(rows))
+    rend = b"\0" * 72
+    if large_header:
+        # 5.0: header size, file format 1, 64 bit block sizes
+        header = b"BLENDER17-01v0500"
+
+        def bhead(code, size):
+            return struct.pack("<4siQqq", code, 0, 0, size, 1)
+    else:
+        header = b"BLENDER-v306"
+
+        def bhead(code, size):
+            return struct.pack("<4siQii", code, size, 0, 0, 1)
+    data = header + bhead(b"REND", len(rend)) + rend + bhead(b"TEST", len(preview)) + preview
+    return data, b"".join(rows)
+
+
+class BlendReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="blend_reader_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def write(self, name, data):
+        file_path = os.path.join(self.temp_dir, name)
+        with open(file_path, "wb") as f:
+            f.write(data)
+        return file_path
+
+    def test_render_settings(self):
+        settings = read_render_settings(TEST_FILE)
+        self.assertEqual(missing_render_settings(settings), [])
+        self.assertEqual(settings["FilePath"], os.path.abspath(TEST_FILE))
+        self.assertEqual(settings["FileName"], "my copy.blend")
+        self.assertEqual(settings["blender_ver"], [3, 6, 13])
+        self.assertEqual(settings["Render_Engine"], "BLENDER_EEVEE")
+        self.assertEqual(settings["Render_Samples"], 64)
+        self.assertEqual((settings["Resolution_X"], settings["Resolution_Y"]), (1920, 1080))
+        self.assertEqual(settings["Total_Frames"], "248 (1-249)")
+        self.assertEqual(settings["Scene"], "Scene")
+        self.assertEqual(settings["Scenes"], 1)
+        self.assertEqual(len(settings["All_Scenes"]), 1)
+        self.assertIs(settings["have_seq"], False)
+
+    def test_gzip_compressed(self):
+        with open(TEST_FILE, "rb") as f:
+            file_path = self.write("compressed.blend", gzip.compress(f.read()))
+        settings = read_render_settings(file_path)
+        expected = read_render_settings(TEST_FILE)
+        for key in ("FilePath", "FileName"):
+            settings.pop(key)
+            expected.pop(key)
+        self.assertEqual(settings, expected)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd_compressed(self):
+        with open(TEST_FILE, "rb") as f:
+            data = f.read()
+        # Several frames, like Blender writes them
+        compressor = zstandard.ZstdCompressor()
+        frames = b"".join(compressor.compress(data[i:i + 65536]) for i in range(0, len(data), 65536))
+        settings = read_render_settings(self.write("compressed.blend", frames))
+        self.assertEqual(settings["Render_Samples"], 64)
+
+    def test_preview(self):
+        for large_header in (False, True):
+            data, rgba = preview_file(3, 2, large_header)
+            preview = read_preview(self.write("preview.blend", data))
+            self.assertEqual((preview.width, preview.height), (3, 2))
+            # Top row first
+            self.assertEqual(preview.rgba, rgba)
+
+    def test_preview_gzip_compressed(self):
+        data, rgba = preview_file(2, 2)
+        preview = read_preview(self.write("preview.blend", gzip.compress(data)))
+        self.assertEqual(preview.rgba, rgba)
+
+    def test_no_preview(self):
+        self.assertIsNone(read_preview(TEST_FILE))
+
+    def test_not_a_blend_file(self):
+        file_path = self.write("notes.blend", b"just some text, not a blend file")
+        with self.assertRaises(BlendReadError):
+            read_render_settings(file_path)
+        with self.assertRaises(BlendReadError):
+            read_preview(file_path)
+
+    def test_empty_file(self):
+        with self.assertRaises(BlendReadError):
+            read_render_settings(self.write("empty.blend", b""))
+
+    def test_truncated_file(self):
+        with open(TEST_FILE, "rb") as f:
+            data = f.read(4096)
+        with self.assertRaises(BlendReadError):
+            read_render_settings(self.write("truncated.blend", data))
+        data, _ = preview_file(4, 4)
+        with self.assertRaises(BlendReadError):
+            read_preview(self.write("truncated_preview.blend", data[:-10]))
+
+    def test_missing_file(self):
+        with self.assertRaises(BlendReadError):
+            read_render_settings(os.path.join(self.temp_dir, "gone.blend"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import io
+import json
+import unittest
+from ipc import (
+    FrameDecoder, ProtocolError, RecordReader, RecordWriter, HEADER, MAX_RECORD_SIZE, encode_record,
+)
+
+
+def frame(record):
+    body = json.dumps(record).encode("utf-8")
+    return HEADER.pack(len(body)) + body
+
+
+class TrickleStream(io.RawIOBase):
+    # Hands out a few bytes per read, like a pipe under load
+
+    def __init__(self, data, chunk_size):
+        self.data = data
+        self.chunk_size = chunk_size
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        chunk, self.data = self.data[:self.chunk_size], self.data[self.chunk_size:]
+        return chunk
+
+
+class IpcTest(unittest.TestCase):
+    def test_round_trip(self):
+        stream = io.BytesIO()
+        writer = RecordWriter(stream)
+        writer.write("hello", pid=42, blender="4.3.0")
+        writer.write("result", path="/projects/ünïcode.blend", settings={"blender_ver": [4, 3, 0]})
+        writer.write("done")
+        stream.seek(0)
+        records = list(RecordReader(stream))
+        self.assertEqual([record["type"] for record in records], ["hello", "result", "done"])
+        self.assertEqual(records[0]["pid"], 42)
+        self.assertEqual(records[1]["path"], "/projects/ünïcode.blend")
+        self.assertEqual(records[1]["settings"], {"blender_ver": [4, 3, 0]})
+
+    def test_records_split_across_reads(self):
+        data = encode_record("progress", path="a.blend", phase="open_mainfile") + encode_record("done")
+        for chunk_size in (1, 3, 7):
+            records = list(RecordReader(TrickleStream(data, chunk_size)))
+            self.assertEqual([record["type"] for record in records], ["progress", "done"])
+
+    def test_decoder_keeps_partial_records(self):
+        data = encode_record("done")
+        decoder = FrameDecoder()
+        self.assertEqual(decoder.feed(data[:-1]), [])
+        self.assertEqual(decoder.pending(), len(data) - 1)
+        self.assertEqual([record["type"] for record in decoder.feed(data[-1:])], ["done"])
+        self.assertEqual(decoder.pending(), 0)
+
+    def test_truncated_record(self):
+        data = encode_record("result", path="a.blend")
+        for end in (2, HEADER.size, len(data) - 1):
+            with self.assertRaises(ProtocolError):
+                list(RecordReader(io.BytesIO(data[:end])))
+
+    def test_oversized_record(self):
+        with self.assertRaises(ProtocolError):
+            FrameDecoder().feed(HEADER.pack(MAX_RECORD_SIZE + 1) + b"{")
+
+    def test_bad_records(self):
+        for data in (
+            HEADER.pack(4) + b"\xff\xfe\xfd\xfc",
+            HEADER.pack(8) + b"not json",
+            frame([1, 2, 3]),
+            frame({"v": 1, "type": "unknown"}),
+            frame({"v": 99, "type": "done"}),
+        ):
+            with self.assertRaises(ProtocolError):
+                FrameDecoder().feed(data)
+
+    def test_unknown_record_type_is_not_written(self):
+        with self.assertRaises(ProtocolError):
+            encode_record("unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
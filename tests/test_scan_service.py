@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import scan_service
+from metadata_cache import MetadataCache
+from worker_pool import LoaderPool, LoaderTimeout
+
+# Runs without Blender or Qt, from the repository root:
+#
+#   python -m pytest tests
+#   python -m unittest discover tests
+
+TEST_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_file", "my copy.blend")
+
+
+class ScanServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="scan_service_test_")
+        self.root = os.path.join(self.temp_dir, "root")
+        os.makedirs(self.root)
+        self.blend_file = os.path.join(self.root, "shot.blend")
+        shutil.copy(TEST_FILE, self.blend_file)
+        self.loader_pool = LoaderPool(size=1)
+        self.metadata_cache = MetadataCache(os.path.join(self.temp_dir, "metadata.sqlite3"))
+        app = scan_service.create_app(
+            [self.root], self.loader_pool, self.metadata_cache, os.path.join(self.temp_dir, "thumbnails")
+        )
+        self.app = app
+
+    def tearDown(self):
+        self.loader_pool.close()
+        self.metadata_cache.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def get(self, endpoint, path):
+        return self.app.test_client().get(endpoint, query_string={"path": path})
+
+    def test_health(self):
+        response = self.app.test_client().get("/health")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()["ok"])
+
+    def test_missing_file_is_404(self):
+        response = self.get("/settings", os.path.join(self.root, "gone.blend"))
+        self.assertEqual(response.status_code, 404)
+
+    def test_not_a_blend_file_is_400(self):
+        for name in ("notes.txt", "shot.blend.txt", "shot.blend1"):
+            response = self.get("/settings", os.path.join(self.root, name))
+            self.assertEqual(response.status_code, 400, name)
+
+    def test_outside_the_roots_is_refused(self):
+        outside = os.path.join(self.temp_dir, "outside.blend")
+        shutil.copy(TEST_FILE, outside)
+        link = os.path.join(self.root, "link.blend")
+        os.symlink(outside, link)
+        for path in (outside, link, os.path.join(self.root, "..", "outside.blend")):
+            self.assertEqual(self.get("/settings", path).status_code, 403, path)
+        # Whether the file exists is not given away
+        self.assertEqual(self.get("/settings", os.path.join(self.temp_dir, "gone.blend")).status_code, 403)
+
+    def test_settings(self):
+        response = self.get("/settings", self.blend_file)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["FileName"], "shot.blend")
+
+    def test_thumbnail_of_a_file_removed_during_the_request_is_404(self):
+        def removed(file_path, stop=None):
+            raise FileNotFoundError(file_path)
+
+        self.metadata_cache.content_hash = removed
+        self.assertEqual(self.get("/thumbnail", self.blend_file).status_code, 404)
+
+    def test_hanging_load_times_out(self):
+        timeouts = []
+
+        def hanging_load(file_path, loader_pool, cache=None, timeout=None):
+            timeouts.append(timeout)
+            raise LoaderTimeout(f"{file_path} took longer than {timeout}s")
+
+        original = scan_service.load_render_settings
+        scan_service.load_render_settings = hanging_load
+        try:
+            response = self.get("/settings", self.blend_file)
+        finally:
+            scan_service.load_render_settings = original
+        self.assertEqual(response.status_code, 504)
+        self.assertIn("error", response.get_json())
+        self.assertEqual(timeouts, [scan_service.LOAD_TIMEOUT])
+
+    def test_concurrent_requests_load_once(self):
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_load(file_path, loader_pool, cache=None, timeout=None):
+            calls.append(file_path)
+            started.set()
+            release.wait(10)
+            return {"FilePath": file_path, "FileName": os.path.basename(file_path)}
+
+        original = scan_service.load_render_settings
+        scan_service.load_render_settings = slow_load
+        try:
+            statuses = []
+
+            def request():
+                statuses.append(self.get("/settings", self.blend_file).status_code)
+
+            threads = [threading.Thread(target=request) for _ in range(4)]
+            threads[0].start()
+            self.assertTrue(started.wait(10))
+            for thread in threads[1:]:
+                thread.start()
+            # Let the waiting requests reach the in-flight call
+            time.sleep(0.2)
+            release.set()
+            for thread in threads:
+                thread.join(10)
+        finally:
+            scan_service.load_render_settings = original
+        self.assertEqual(statuses, [200] * 4)
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import os
+import sys
+import zlib
+import struct
+import tempfile
+import subprocess
+from blend_reader import BlendReadError, read_preview
+from tracing import span
+from process_tree import run_process
+from metadata_cache import cache_dir, content_hash
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+RENDER_SCRIPT = os.path.join(script_dir, "render_thumbnail.py")
+
+# Seconds a fallback preview render may take, and extra time for starting
+# Blender and opening the file before the process is killed from outside
+RENDER_BUDGET = 60
+STARTUP_GRACE = 60
+
+# Thumbnails are kept in one cache directory rather than next to the .blend
+# files, named after a hash of the file contents: a changed file gets a new
+# one, while copies, moved and touched files share theirs and are never
+# rendered twice. They are stored downscaled to THUMBNAIL_SIZE, so the GUI
+# never decodes anything bigger.
+THUMBNAIL_SIZE = 128
+# Bytes of thumbnails kept on disk, the least recently used go first
+DISK_BUDGET = 256 * 1024 * 1024
+
+
+def thumbnail_dir():
+    return os.path.join(cache_dir(), "thumbnails")
+
+
+def thumbnail_path_for(file_path, directory=None, digest=None):
+    # `digest` is the content_hash() of the file if known, e.g. from
+    # MetadataCache.content_hash(), which only reads files that changed
+    return os.path.join(directory or thumbnail_dir(), f"{digest or content_hash(file_path)}.png")
+
+
+def prune_thumbnails(directory=None, budget=DISK_BUDGET):
+    # Drops the least recently used thumbnails until the directory fits the
+    # budget. Returns how many were removed.
+    directory = directory or thumbnail_dir()
+    entries = []
+    try:
+        with os.scandir(directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(".png"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return 0
+    entries.sort(reverse=True)
+    total = 0
+    removed = 0
+    for _, size, path in entries:
+        total += size
+        if total > budget:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def is_up_to_date(preview_path, blend_file):
+    try:
+        return os.path.getmtime(preview_path) >= os.path.getmtime(blend_file)
+    except OSError:
+        return False
+
+
+def downscale_rgba(width, height, rgba, size=THUMBNAIL_SIZE):
+    # Box filter by a whole factor until the longest side fits `size`
+    factor = -(-max(width, height) // size)
+    if factor <= 1:
+        return width, height, rgba
+    out_width, out_height = max(1, width // factor), max(1, height // factor)
+    stride = width * 4
+    step = factor * 4
+    count = factor * factor
+    out = bytearray(out_width * out_height * 4)
+    index = 0
+    for y in range(out_height):
+        rows = [rgba[(y * factor + dy) * stride:(y * factor + dy + 1) * stride] for dy in range(factor)]
+        for x in range(out_width):
+            start = x * step
+            for channel in range(4):
+                total = 0
+                for row in rows:
+                    total += sum(row[start + channel:start + step:4])
+                out[index] = total // count
+                index += 1
+    return out_width, out_height, bytes(out)
+
+
+def write_png(file_path, width, height, rgba):
+    # 8 bit RGBA PNG, rows top to bottom. Written to a temp file first so a
+    # concurrent reader never sees half a thumbnail.
+    stride = width * 4
+    raw = b"".join(
+        b"\0" + rgba[row * stride:(row + 1) * stride] for row in range(height)
+    )
+
+    def chunk(tag, data):
+        return (
+            struct.pack(">I", len(data)) + tag + data
+            + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+        )
+
+    png = (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 6))
+        + chunk(b"IEND", b"")
+    )
+    # A temp file of its own: threads writing the same thumbnail (copies of
+    # a file share one) must not share one
+    fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(file_path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(png)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def extract_embedded_thumbnail(blend_file, preview_path):
+    # Write the preview stored inside the .blend file as a PNG, no bpy needed.
+    # Returns False when the file has no preview.
+    try:
+        preview = read_preview(blend_file)
+    except BlendReadError as e:
+        print(str(e))
+        return False
+    if preview is None:
+        return False
+    write_png(preview_path, *downscale_rgba(preview.width, preview.height, preview.rgba))
+    return True
+
+
+def ensure_thumbnail(blend_file, preview_path, budget=RENDER_BUDGET, on_process=None):
+    # Embedded preview first, a fast preview render through
+    # render_thumbnail.py only for files saved without one. Safe to run off
+    # the GUI thread, it only touches files. on_process gets the render
+    # process (see process_tree.run_process). `preview_path` comes from
+    # thumbnail_path_for(), a path that exists is the thumbnail of these
+    # contents however old the file looks.
+    if os.path.exists(preview_path):
+        # Recently used, see prune_thumbnails
+        os.utime(preview_path)
+        return preview_path
+    os.makedirs(os.path.dirname(preview_path), exist_ok=True)
+    with span("embedded_preview", blend_file) as preview_span:
+        found = extract_embedded_thumbnail(blend_file, preview_path)
+        preview_span.set(found=found)
+    if found:
+        return preview_path
+
+    try:
+        with span("thumbnail_render", blend_file):
+            returncode = run_process(
+                [
+                    sys.executable, RENDER_SCRIPT, blend_file, os.path.dirname(preview_path),
+                    "--output", preview_path, "--profile", "preview",
+                    "--size", str(THUMBNAIL_SIZE), "--budget", str(budget),
+                ],
+                timeout=budget + STARTUP_GRACE,
+                on_process=on_process,
+                cwd=script_dir,
+            )
+    except subprocess.TimeoutExpired:
+        print(f"Thumbnail render of {blend_file} timed out")
+        return None
+    except OSError as e:
+        print(f"Could not start thumbnail render of {blend_file}: {str(e)}")
+        return None
+    if os.path.exists(preview_path) and returncode == 0:
+        return preview_path
+    print(f"Thumbnail not found at {preview_path}")
+    return None
@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+# Opt-in timing of where a scan, thumbnail or save spends its time. Turned
+# on by pointing BLENDER_DIRECTORY_CHECKER_TRACE at a file (or enable()),
+# which every process started from then on inherits, so the Blender scripts
+# trace into the same file. Every span is one JSON line:
+#
+#   {"phase": "open_mainfile", "path": ..., "ts": <epoch us>, "dur": <us>,
+#    "rss_kb": ..., "pid": ..., "tid": ..., "proc": "blender_loader.py"}
+#
+#   python tracing.py summary trace.jsonl          slowest files and phases
+#   python tracing.py chrome trace.jsonl -o t.json  for chrome://tracing / Perfetto
+#
+# When tracing is off span() hands out one shared object that does nothing.
+
+TRACE_ENV = "BLENDER_DIRECTORY_CHECKER_TRACE"
+
+_trace_path = os.environ.get(TRACE_ENV) or None
+_trace_fd = None
+_lock = threading.Lock()
+_process = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+
+
+def enable(trace_path):
+    # Also for processes started after this call
+    global _trace_path
+    _trace_path = os.path.abspath(trace_path)
+    os.environ[TRACE_ENV] = _trace_path
+
+
+def enabled():
+    return _trace_path is not None
+
+
+def current_rss_kb():
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current, the best there is outside Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _write(record):
+    global _trace_fd
+    line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+    with _lock:
+        if _trace_fd is None:
+            # O_APPEND: lines of several processes never end up interleaved
+            _trace_fd = os.open(_trace_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        os.write(_trace_fd, line)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    def __init__(self, phase, path, fields):
+        self.record = {"phase": phase, "path": path}
+        self.record.update(fields)
+
+    def set(self, **fields):
+        # Results only known at the end of the span, e.g. cache hits
+        self.record.update(fields)
+
+    def __enter__(self):
+        self.record["ts"] = time.time_ns() // 1000
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record["dur"] = round((time.perf_counter() - self._start) * 1e6)
+        if exc_type is not None:
+            self.record["error"] = f"{exc_type.__name__}: {exc}"
+        self.record["rss_kb"] = current_rss_kb()
+        self.record["pid"] = os.getpid()
+        self.record["tid"] = threading.get_ident()
+        self.record["proc"] = _process
+        try:
+            _write(self.record)
+        except OSError:
+            pass
+        return False
+
+
+def span(phase, path=None, **fields):
+    # with span("open_mainfile", file_path): ...
+    if _trace_path is None:
+        return _NULL_SPAN
+    return Span(phase, path, fields)
+
+
+def load_spans(trace_path):
+    spans = []
+    with open(trace_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except ValueError:
+                # A process killed in the middle of a line
+                continue
+    return spans
+
+
+def summarize(spans, top=10):
+    phases, files = {}, {}
+    for record in spans:
+        phase = phases.setdefault(record["phase"], {"count": 0, "total": 0, "max": 0, "errors": 0})
+        phase["count"] += 1
+        phase["total"] += record["dur"]
+        phase["max"] = max(phase["max"], record["dur"])
+        phase["errors"] += "error" in record
+        if record.get("path"):
+            file_phases = files.setdefault(record["path"], {})
+            file_phases[record["phase"]] = file_phases.get(record["phase"], 0) + record["dur"]
+
+    lines = [f"{'phase':<22} {'count':>7} {'total s':>9} {'mean ms':>9} {'max ms':>9} {'errors':>6}"]
+    for name, phase in sorted(phases.items(), key=lambda item: -item[1]["total"]):
+        lines.append(
+            f"{name:<22} {phase['count']:>7} {phase['total'] / 1e6:>9.3f} "
+            f"{phase['total'] / phase['count'] / 1e3:>9.1f} {phase['max'] / 1e3:>9.1f} {phase['errors']:>6}"
+        )
+
+    # Nested spans of a file overlap, so files are ranked by their slowest phase
+    lines.append("")
+    lines.append(f"Slowest {top} files")
+    slowest = sorted(files.items(), key=lambda item: -max(item[1].values()))[:top]
+    for path, file_phases in slowest:
+        phase, duration = max(file_phases.items(), key=lambda item: item[1])
+        lines.append(f"{duration / 1e3:>9.1f} ms  {phase:<22} {path}")
+    return "\n".join(lines)
+
+
+def to_chrome_trace(spans):
+    # Trace event format, complete ("X") events plus process names
+    events, processes = [], {}
+    for record in spans:
+        processes[record["pid"]] = record.get("proc")
+        args = {key: value for key, value in record.items()
+                if key not in ("phase", "ts", "dur", "pid", "tid", "proc")}
+        events.append({
+            "name": record["phase"], "cat": "phase", "ph": "X",
+            "ts": record["ts"], "dur": record["dur"],
+            "pid": record["pid"], "tid": record["tid"], "args": args,
+        })
+    for pid, name in processes.items():
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"{name} ({pid})"}})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize or convert a trace file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    summary = commands.add_parser("summary", help="slowest phases and files")
+    summary.add_argument("trace_file")
+    summary.add_argument("--top", type=int, default=10)
+    chrome = commands.add_parser("chrome", help="convert to Chrome trace event JSON")
+    chrome.add_argument("trace_file")
+    chrome.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+
+    spans = load_spans(args.trace_file)
+    if args.command == "summary":
+        print(summarize(spans, args.top))
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(to_chrome_trace(spans), f)
@@ -0,0 +1,217 @@
+import os
+import sys
+import subprocess
+import threading
+from ipc import RecordReader, RecordWriter, ProtocolError, ALL_SCENES_KEY
+from tracing import span
+from process_tree import group_options, kill_process_tree
+from blend_reader import (
+    BlendReadError, read_render_settings, missing_render_settings, RENDER_SETTINGS_KEYS
+)
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+LOADER_SCRIPT = os.path.join(script_dir, "blender_loader.py")
+
+# How many files a resident worker handles before it is replaced by a fresh
+# process. Blender does not give back all memory between open_mainfile calls.
+DEFAULT_MAX_FILES_PER_WORKER = 50
+
+
+class LoaderError(Exception):
+    pass
+
+
+class LoaderTimeout(LoaderError):
+    pass
+
+
+class LoaderWorker:
+    # One resident `blender_loader.py --worker` process. bpy is imported once
+    # when the process starts, every load() after that only pays for
+    # open_mainfile + render_Settings.
+
+    def __init__(self, max_files=DEFAULT_MAX_FILES_PER_WORKER):
+        self.max_files = max_files
+        self.handled = 0
+        with span("spawn_worker"):
+            self.process = subprocess.Popen(
+                [sys.executable, LOADER_SCRIPT, "--worker"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                cwd=script_dir,
+                **group_options(),
+            )
+        self.reader = RecordReader(self.process.stdout)
+        self.writer = RecordWriter(self.process.stdin)
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def is_exhausted(self):
+        return self.max_files and self.handled >= self.max_files
+
+    def load(self, file_path, on_progress=None, timeout=None):
+        # With a timeout, a file that takes longer kills the worker (bpy
+        # cannot be interrupted) and raises LoaderError
+        if not self.is_alive():
+            raise LoaderError("Loader worker is not running")
+        try:
+            self.writer.write("load", path=file_path)
+        except OSError as e:
+            raise LoaderError(f"Loader worker is not accepting files: {e}")
+        self.handled += 1
+
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, kill_process_tree, args=(self.process,))
+            timer.daemon = True
+            timer.start()
+        try:
+            with span("load_bpy", file_path, worker=self.process.pid):
+                return self._read_result(file_path, on_progress)
+        except LoaderError:
+            if timer is not None and not timer.is_alive() and not self.is_alive():
+                raise LoaderTimeout(f"Loading {file_path} took longer than {timeout}s")
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    def _read_result(self, file_path, on_progress):
+        while True:
+            try:
+                record = self.reader.read()
+            except ProtocolError as e:
+                self.process.kill()
+                raise LoaderError(f"Loader worker sent garbage: {e}")
+            if record is None:
+                raise LoaderError(f"Loader worker exited while reading {file_path}")
+            record_type = record["type"]
+            if record_type == "progress" and on_progress is not None:
+                on_progress(record)
+            elif record_type == "result" and record.get("path") == file_path:
+                return record["settings"]
+            elif record_type == "error" and record.get("path") == file_path:
+                raise LoaderError(record.get("message"))
+
+    def close(self, timeout=5):
+        if self.process.stdin and not self.process.stdin.closed:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_process_tree(self.process)
+            self.process.wait()
+
+
+class LoaderPool:
+    # Up to `size` resident loader workers, started lazily. load() is thread
+    # safe: every call borrows an idle worker (or starts a new one) and gives
+    # it back afterwards. Workers are recycled after `max_files_per_worker`
+    # files or when they die.
+
+    def __init__(self, size=None, max_files_per_worker=DEFAULT_MAX_FILES_PER_WORKER):
+        self.size = size or os.cpu_count() or 1
+        self.max_files_per_worker = max_files_per_worker
+        self._idle = []
+        self._started = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise LoaderError("Loader pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._started < self.size:
+                    self._started += 1
+                    break
+                self._cond.wait()
+        try:
+            return LoaderWorker(self.max_files_per_worker)
+        except OSError as e:
+            with self._cond:
+                self._started -= 1
+                self._cond.notify()
+            raise LoaderError(f"Could not start loader worker: {e}")
+
+    def _release(self, worker):
+        with self._cond:
+            keep = (
+                not self._closed
+                and self._started <= self.size
+                and worker.is_alive()
+                and not worker.is_exhausted()
+            )
+            if keep:
+                self._idle.append(worker)
+            else:
+                self._started -= 1
+            self._cond.notify()
+        if not keep:
+            worker.close()
+
+    def load(self, file_path, on_progress=None, timeout=None):
+        worker = self._acquire()
+        try:
+            return worker.load(file_path, on_progress, timeout)
+        finally:
+            self._release(worker)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for worker in idle:
+            worker.close()
+
+
+def load_render_settings(file_path, loader_pool, cache=None, timeout=None):
+    # Decode the settings straight from the file and only borrow a bpy worker
+    # when the reader cannot decode some of the fields (or the whole file).
+    # With a MetadataCache, unchanged files are not looked at again. `timeout`
+    # limits the time a bpy worker may spend on the file.
+    if cache is not None:
+        with span("cache_lookup", file_path) as lookup:
+            settings = cache.get(file_path)
+            # Entries from before a field was added are extracted again
+            if settings is not None and missing_render_settings(settings):
+                settings = None
+            lookup.set(hit=settings is not None)
+        if settings is not None:
+            return settings
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        stat = None
+    settings, complete = _extract_render_settings(file_path, loader_pool, timeout)
+    if cache is not None and complete:
+        cache.put(file_path, settings, stat)
+    return settings
+
+
+def _extract_render_settings(file_path, loader_pool, timeout=None):
+    try:
+        with span("read_blend", file_path):
+            settings = read_render_settings(file_path)
+    except BlendReadError:
+        return loader_pool.load(file_path, timeout=timeout), True
+    missing = missing_render_settings(settings)
+    if not missing:
+        return settings, True
+    try:
+        return loader_pool.load(file_path, timeout=timeout), True
+    except LoaderError as e:
+        # No bpy on this machine (or it failed), show what could be decoded
+        # but do not cache it
+        print(f"Could not load {', '.join(missing)} for {file_path}: {str(e)}")
+        return {
+            key: settings.get(key, "-") for key in RENDER_SETTINGS_KEYS
+            if key != ALL_SCENES_KEY or key in settings
+        }, False